@@ -0,0 +1,215 @@
+"""
+Резервные копии базы через online backup API SQLite.
+
+Копия снимается на отдельном соединении, которое держит открытую читающую
+транзакцию: в WAL это фиксирует снимок базы, поэтому писатель продолжает
+коммитить (галочки, импорт), а копирование не начинается заново после каждой
+записи. Страницы переносятся порциями по BACKUP_STEP_PAGES с паузой между
+ними, копия проверяется PRAGMA integrity_check и только потом получает
+итоговое имя; хранятся последние KEEP_BACKUPS копий.
+
+Из командной строки:
+  python backup.py create            # снять копию рядом с базой (папка backups)
+  python backup.py list
+  python backup.py verify <файл>
+  python backup.py restore <файл>    # приложение должно быть закрыто
+"""
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import db
+
+BACKUP_STEP_PAGES = 1024   # страниц за один шаг sqlite3 backup (~4 МБ при странице 4 КиБ)
+BACKUP_PAUSE_S = 0.002     # пауза между шагами, чтобы не забирать диск у приложения
+KEEP_BACKUPS = 7           # сколько последних копий хранить
+
+# progress(скопировано страниц, всего страниц)
+ProgressCallback = Callable[[int, int], None]
+
+
+class BackupCancelled(Exception):
+    """Снятие копии остановлено (выход из приложения); недописанный файл удалён."""
+
+
+class BackupError(Exception):
+    """Файл копии повреждён или не подходит этому приложению."""
+
+
+def backup_dir() -> str:
+    """Папка копий по умолчанию: backups рядом с файлом базы."""
+    return os.path.join(os.path.dirname(db.get_db_path()), "backups")
+
+
+def _prefix() -> str:
+    return os.path.splitext(os.path.basename(db.get_db_path()))[0] + "-"
+
+
+def _snapshot_path(dest_dir: str, tag: str) -> str:
+    # микросекунды в имени: две копии за одну секунду не совпадут; пометка — после точки,
+    # чтобы её можно было отличить от счётчика совпадений
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    base, suffix = os.path.join(dest_dir, f"{_prefix()}{stamp}"), f".{tag}.db" if tag else ".db"
+    path, n = base + suffix, 1
+    while os.path.exists(path):
+        path = f"{base}-{n}{suffix}"; n += 1
+    return path
+
+
+def _tag(path: str) -> str:
+    """Пометка копии ("" у обычных, "pre-restore" у страховочных перед восстановлением)."""
+    return os.path.basename(path)[len(_prefix()):-len(".db")].partition(".")[2]
+
+
+def list_backups(dest_dir: Optional[str] = None) -> List[str]:
+    """Файлы копий, от старых к новым (по времени записи файла, при равенстве — по имени)."""
+    dest_dir = dest_dir or backup_dir()
+    if not os.path.isdir(dest_dir):
+        return []
+    prefix = _prefix()
+    paths = [os.path.join(dest_dir, n) for n in os.listdir(dest_dir) if n.startswith(prefix) and n.endswith(".db")]
+    return sorted(paths, key=lambda p: (os.stat(p).st_mtime_ns, p))
+
+
+def _remove(path: str):
+    """Удаляет файл базы вместе с -wal/-shm, если они остались."""
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def rotate(dest_dir: Optional[str] = None, keep: int = KEEP_BACKUPS) -> List[str]:
+    """
+    Удаляет обычные копии сверх keep последних; возвращает удалённые пути.
+    Копии с пометкой (pre-restore) в счёт keep не входят и не удаляются.
+    """
+    plain = [p for p in list_backups(dest_dir) if not _tag(p)]
+    old = plain[:-keep] if keep > 0 else []  # keep=0 — не удалять ничего
+    for path in old:
+        _remove(path)
+    return old
+
+
+def verify_backup(path: str) -> Dict[str, int]:
+    """
+    PRAGMA integrity_check и версия схемы копии. Возвращает page_count, bytes и schema_version;
+    при повреждении или слишком новой схеме — BackupError.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+        if problems != ["ok"]:
+            raise BackupError(f"{path}: " + "; ".join(problems[:5]))
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > db.SCHEMA_VERSION:
+            raise BackupError(f"{path}: копия новее приложения (версия схемы {version} > {db.SCHEMA_VERSION})")
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        size = conn.execute("PRAGMA page_size").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path}: {e}") from e
+    finally:
+        conn.close()
+    return {"page_count": pages, "bytes": pages * size, "schema_version": version}
+
+
+def create_backup(dest_dir: Optional[str] = None,
+                  tag: str = "",
+                  keep: int = KEEP_BACKUPS,
+                  pages: int = BACKUP_STEP_PAGES,
+                  pause: float = BACKUP_PAUSE_S,
+                  progress: Optional[ProgressCallback] = None,
+                  cancelled: Callable[[], bool] = lambda: False) -> Dict:
+    """
+    Снимает проверенную копию текущей базы в dest_dir (по умолчанию backup_dir()).
+    Выполнять вне GUI-потока и не на потоке-писателе: копия большой базы идёт долго,
+    а соединения потоков приложения она не трогает.
+    Пока идёт копия, читающая транзакция держит снимок, и чекпоинты WAL не
+    продвигаются дальше его начала: -wal файл растёт на объём записей за время
+    копирования. После COMMIT выполняется пассивный чекпоинт.
+    Возвращает path, bytes, page_count, seconds и removed (удалённые ротацией копии).
+    """
+    dest_dir = dest_dir or backup_dir()
+    os.makedirs(dest_dir, exist_ok=True)
+    path = _snapshot_path(dest_dir, tag)
+    tmp = path + ".part"
+    started = time.perf_counter()
+
+    def step(_status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if cancelled():
+            raise BackupCancelled(path)
+        if pause and remaining:
+            time.sleep(pause)
+
+    # миграции до снимка: копия всегда в актуальной схеме; соединение, открытое
+    # только ради них на фоновом потоке, сразу закрываем, чтобы оно не осталось висеть
+    owned = not db.has_conn()
+    db.get_conn()
+    if owned:
+        db.close_conn()
+    src = sqlite3.connect(db.get_db_path(), isolation_level=None)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.execute(f"PRAGMA busy_timeout={db.CONNECTION_PROFILE['busy_timeout']}")
+        # читающая транзакция фиксирует снимок: записи приложения идут в WAL и копию не перезапускают
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        src.backup(dst, pages=pages, progress=step)
+        src.execute("COMMIT")
+        # пока снимок был открыт, чекпоинт не мог перенести WAL дальше его начала — догоняем
+        src.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        # копия унаследовала WAL от исходной базы; без этого проверка оставила бы -wal/-shm рядом с .part
+        dst.execute("PRAGMA journal_mode=DELETE").fetchall()
+        dst.close()
+        info = verify_backup(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        dst.close()
+        _remove(tmp)
+        raise
+    finally:
+        src.close()
+    removed = rotate(dest_dir, keep)
+    return {"path": path, "bytes": info["bytes"], "page_count": info["page_count"],
+            "seconds": round(time.perf_counter() - started, 2), "removed": removed}
+
+
+def restore_backup(path: str) -> Dict:
+    """
+    Проверяет копию, сохраняет текущую базу копией с пометкой pre-restore и
+    заменяет содержимое базы копией (db.restore_from на соединении этого потока).
+    В приложении вызывать на потоке-писателе.
+    """
+    verify_backup(path)
+    safety = create_backup(tag="pre-restore", keep=0)
+    db.restore_from(path)
+    return {"restored": path, "previous": safety["path"]}
+
+
+def _main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "create"
+    if cmd == "create":
+        info = create_backup(progress=lambda done, total: print(f"\r{done}/{total} страниц", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        print(f"{info['path']}  {info['bytes'] / 1024:.0f} КиБ за {info['seconds']} с")
+    elif cmd == "list":
+        for path in list_backups():
+            print(f"{path}  {os.path.getsize(path) / 1024:.0f} КиБ")
+    elif cmd == "verify" and len(argv) == 2:
+        info = verify_backup(argv[1])
+        print(f"ok, версия схемы {info['schema_version']}, {info['bytes'] / 1024:.0f} КиБ")
+    elif cmd == "restore" and len(argv) == 2:
+        info = restore_backup(argv[1])
+        print(f"восстановлено из {info['restored']}; прежняя база сохранена в {info['previous']}")
+    else:
+        print(__doc__, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,10 @@
+"""
+Бенчмарки горячих путей db.py и окон на синтетических данных.
+
+    python -m bench run --lists 2000 --items 30 --out before.json
+    python -m bench run --lists 2000 --items 30 --out after.json
+    python -m bench compare before.json after.json
+
+База создаётся во временном каталоге (db.set_db_path), рабочая не трогается.
+Замеры окон идут без экрана (QT_QPA_PLATFORM=offscreen); --no-gui их пропускает.
+"""
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import db
+from bench import datagen, memory, scenarios
+
+NOISE_FLOOR_MS = 0.05  # разница меньше этого не считается регрессией
+
+
+def _with_dataset(args, work):
+    """Генерирует данные во временной базе, вызывает work(spec, ids) и убирает базу."""
+    spec = datagen.DatasetSpec(lists=args.lists, items=args.items, text_share=args.text_share,
+                               note_chars=args.note_chars, alphabet=args.alphabet, seed=args.seed)
+    tmp = tempfile.mkdtemp(prefix="checklist-bench-")
+    db.set_db_path(os.path.join(tmp, "bench.db"))
+    try:
+        t = time.perf_counter()
+        ids = datagen.generate(spec)
+        print(f"данные: {spec.lists} списков за {time.perf_counter() - t:.1f} с ({db.get_db_path()})")
+        return spec, work(spec, ids)
+    finally:
+        db.close_conn()
+        if not args.keep_db:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _meta(spec: datagen.DatasetSpec, **extra) -> Dict:
+    return {
+        "spec": spec.as_dict(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **extra,
+    }
+
+
+def _save(report: Dict, path: str) -> None:
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"сохранено в {path}")
+
+
+def run(args) -> int:
+    def work(spec, ids):
+        results = scenarios.run_db(spec, ids, args.repeat)
+        if not args.no_gui:
+            results.update(scenarios.run_gui(spec, ids, args.repeat))
+        return results
+    spec, results = _with_dataset(args, work)
+
+    for name, r in results.items():
+        print(f"{name:45} median {r['median_ms']:9.3f} ms   p95 {r['p95_ms']:9.3f} ms")
+    _save({"meta": _meta(spec, repeat=args.repeat), "results": results}, args.out)
+    return 0
+
+
+def run_memory(args) -> int:
+    spec, results = _with_dataset(args, lambda spec, ids: memory.run_memory(ids))
+    for name, r in results.items():
+        print(f"{name:42} строк {r['rows']:>7}   держит {r['retained_bytes'] / 1024:>9.0f} КиБ"
+              f"   пик {r['peak_bytes'] / 1024:>9.0f} КиБ")
+    _save({"meta": _meta(spec), "memory": results}, args.out)
+    return 0
+
+
+def run_profile(args) -> int:
+    """Одни и те же записи под прежним (без WAL) и текущим профилем соединения, каждый на своей базе."""
+    saved = dict(db.CONNECTION_PROFILE)
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        for name, profile in scenarios.connection_profiles().items():
+            db.CONNECTION_PROFILE.clear(); db.CONNECTION_PROFILE.update(profile)
+            spec, measured = _with_dataset(args, lambda spec, ids: scenarios.run_writes(ids, args.repeat))
+            results.update({f"{op}[{name}]": r for op, r in measured.items()})
+    finally:
+        db.CONNECTION_PROFILE.clear(); db.CONNECTION_PROFILE.update(saved)
+
+    for op in ("set_item_checked", "add_item"):
+        old, new = results.get(f"{op}[legacy]"), results.get(f"{op}[current]")
+        if old and new:
+            print(f"{op:20} p50 {old['median_ms']:7.3f} -> {new['median_ms']:7.3f} ms   "
+                  f"p95 {old['p95_ms']:7.3f} -> {new['p95_ms']:7.3f} ms")
+    _save({"meta": _meta(spec, repeat=args.repeat, profiles=scenarios.connection_profiles()), "results": results},
+          args.out)
+    return 0
+
+
+def compare_reports(old: Dict, new: Dict, metric: str, threshold: float) -> List[Tuple[str, float, float, bool]]:
+    """(сценарий, было, стало, регрессия?) для сценариев, замеренных в обоих прогонах."""
+    rows = []
+    for name, r in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name][metric], r[metric]
+        regressed = after > before * (1 + threshold) and after - before > NOISE_FLOOR_MS
+        rows.append((name, before, after, regressed))
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.old, encoding="utf-8") as f: old = json.load(f)
+    with open(args.new, encoding="utf-8") as f: new = json.load(f)
+    if old["meta"]["spec"] != new["meta"]["spec"]:
+        print("внимание: прогоны сделаны на разных наборах данных")
+    rows = compare_reports(old, new, args.metric, args.threshold)
+    for name, before, after, regressed in rows:
+        change = (after / before - 1) * 100 if before else 0.0
+        mark = "  РЕГРЕССИЯ" if regressed else ""
+        print(f"{name:45} {before:9.3f} -> {after:9.3f} ms ({change:+6.1f}%){mark}")
+    regressions = [r for r in rows if r[3]]
+    print(f"регрессий: {len(regressions)} (порог {args.threshold:.0%} по {args.metric})")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m bench", description="Бенчмарки Checklist Notes")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    def dataset_args(cmd):
+        cmd.add_argument("--lists", type=int, default=1000)
+        cmd.add_argument("--items", type=int, default=20, help="пунктов в каждом чеклисте")
+        cmd.add_argument("--text-share", type=float, default=0.2, help="доля текстовых заметок")
+        cmd.add_argument("--note-chars", type=int, default=2000)
+        cmd.add_argument("--alphabet", choices=["cyrillic", "latin", "mixed"], default="mixed")
+        cmd.add_argument("--seed", type=int, default=1)
+        cmd.add_argument("--keep-db", action="store_true", help="не удалять временную базу")
+        cmd.add_argument("--out", help="куда сохранить JSON с результатами")
+
+    r = sub.add_parser("run", help="сгенерировать данные и замерить сценарии")
+    dataset_args(r)
+    r.add_argument("--repeat", type=int, default=20)
+    r.add_argument("--no-gui", action="store_true", help="без замеров окон")
+    r.set_defaults(func=run)
+
+    m = sub.add_parser("memory", help="память под результаты: dict/Row против записей и итераторов")
+    dataset_args(m)
+    m.set_defaults(func=run_memory)
+
+    pr = sub.add_parser("profile", help="записи (галочка, новый пункт) под прежним и текущим профилем PRAGMA")
+    dataset_args(pr)
+    pr.add_argument("--repeat", type=int, default=300)
+    pr.set_defaults(func=run_profile)
+
+    c = sub.add_parser("compare", help="сравнить два JSON-прогона")
+    c.add_argument("old"); c.add_argument("new")
+    c.add_argument("--metric", default="median_ms", choices=["min_ms", "median_ms", "p95_ms", "mean_ms"])
+    c.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление, доля (0.2 = 20%%)")
+    c.set_defaults(func=compare)
+
+    args = p.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Детерминированный генератор тестовой базы через db.create_list."""
+import random
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+import db
+
+CYRILLIC_WORDS = [
+    "молоко", "хлеб", "сыр", "яблоки", "купить", "позвонить", "отчёт", "встреча", "ремонт", "аптека",
+    "билеты", "подарок", "уборка", "счёт", "письмо", "врач", "машина", "дача", "книга", "зарядка",
+    "проект", "отпуск", "налоги", "соседи", "кофе", "гречка", "масло", "мама", "спортзал", "лампочка",
+]
+LATIN_WORDS = [
+    "milk", "bread", "cheese", "apples", "buy", "call", "report", "meeting", "repair", "pharmacy",
+    "tickets", "gift", "cleaning", "invoice", "email", "doctor", "car", "garden", "book", "charger",
+    "project", "vacation", "taxes", "review", "coffee", "deploy", "backup", "release", "gym", "bulb",
+]
+COLORS = ["#ffffff", "#fff7cc", "#e7f5ff", "#ffe7f0", "#e8ffe7", "#fde68a", "#bfdbfe"]
+
+
+@dataclass
+class DatasetSpec:
+    lists: int = 1000
+    items: int = 20           # пунктов в каждом чеклисте
+    text_share: float = 0.2   # доля текстовых заметок среди списков
+    note_chars: int = 2000    # длина текста заметки
+    alphabet: str = "mixed"   # cyrillic | latin | mixed
+    pinned_share: float = 0.05
+    seed: int = 1
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _vocabulary(alphabet: str) -> List[str]:
+    if alphabet == "cyrillic":
+        return CYRILLIC_WORDS
+    if alphabet == "latin":
+        return LATIN_WORDS
+    if alphabet == "mixed":
+        return CYRILLIC_WORDS + LATIN_WORDS
+    raise ValueError(f"Неизвестный алфавит: {alphabet}")
+
+
+def _phrase(rnd: random.Random, words: List[str], n: int) -> str:
+    return " ".join(rnd.choice(words) for _ in range(n))
+
+
+def _note(rnd: random.Random, words: List[str], chars: int) -> str:
+    parts, size = [], 0
+    while size < chars:
+        line = _phrase(rnd, words, rnd.randint(4, 12)).capitalize() + ".\n"
+        parts.append(line); size += len(line)
+    return "".join(parts)[:chars]
+
+
+def generate(spec: DatasetSpec) -> Dict[str, List[int]]:
+    """
+    Заполняет текущую базу (см. db.set_db_path) по spec; одинаковый seed даёт
+    одинаковое содержимое. Возвращает id созданных чеклистов и заметок.
+    """
+    rnd = random.Random(spec.seed)
+    words = _vocabulary(spec.alphabet)
+    checklists, notes = [], []
+    with db.transaction():
+        for i in range(spec.lists):
+            title = f"{_phrase(rnd, words, 2).capitalize()} {i}"
+            color = rnd.choice(COLORS)
+            pinned = rnd.random() < spec.pinned_share
+            if rnd.random() < spec.text_share:
+                notes.append(db.create_list(title, [], color=color, pinned=pinned, kind="text",
+                                            note_text=_note(rnd, words, spec.note_chars)))
+            else:
+                items = [_phrase(rnd, words, rnd.randint(1, 4)) for _ in range(spec.items)]
+                checklists.append(db.create_list(title, items, color=color, pinned=pinned))
+    return {"checklists": checklists, "notes": notes}
+
+
+def _count(query: str) -> int:
+    return sum(1 for _ in db.iter_lists(query=query))
+
+
+def sample_queries(spec: DatasetSpec) -> List[str]:
+    """
+    Поисковые строки из словаря данных, по одной на вид: короткая (меньше SEARCH_MIN_CHARS,
+    ищется по названиям), слово целиком и середина слова (не короче SEARCH_MIN_CHARS).
+    Берётся первый кандидат, который действительно сужает выборку в текущей базе:
+    запрос, совпадающий со всеми списками, мерил бы просто get_lists.
+    """
+    words = _vocabulary(spec.alphabet)
+    n = db.SEARCH_MIN_CHARS
+    candidates = {
+        "короткая": [w[:n - 1] for w in words],
+        "слово": words[1:],
+        "середина слова": [w[1:n + 2] for w in words[2:] if len(w) >= n + 2],
+    }
+    total = _count("")
+    queries = []
+    for kind, options in candidates.items():
+        q = next((q for q in options if _count(q) < total), None)
+        if q is None:
+            raise RuntimeError(f"нет запроса вида «{kind}», который сужал бы выборку из {total} списков")
+        queries.append(q)
+    return queries
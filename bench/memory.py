@@ -0,0 +1,48 @@
+"""Память под результаты: прежние dict/sqlite3.Row против записей со __slots__ и потоковых итераторов."""
+import gc
+import tracemalloc
+from typing import Callable, Dict, List
+
+import db
+
+
+def _footprint(fn: Callable[[], object]) -> Dict[str, int]:
+    """retained — сколько занимает возвращённый результат, peak — пик во время вызова (байты)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rows = result if isinstance(result, int) else len(result)
+    del result
+    return {"rows": rows, "retained_bytes": current - base, "peak_bytes": peak - base}
+
+
+def _old_get_lists() -> List[dict]:
+    # как было до ListRecord: sqlite3.Row -> dict на каждую строку
+    cur = db.get_conn().execute(f"SELECT {db._LIST_COLUMNS} FROM lists l WHERE l.archived = 0 AND l.deleted_at IS NULL "
+                                f"ORDER BY {db._HOME_ORDER}")
+    return [dict(r) for r in cur.fetchall()]
+
+
+def _old_get_items(list_id: int) -> list:
+    return db.get_conn().execute(db._ITEMS_SQL, (list_id,)).fetchall()
+
+
+def run_memory(ids: Dict[str, List[int]]) -> Dict[str, Dict[str, int]]:
+    results = {
+        "lists: dict (прежний get_lists)": _footprint(_old_get_lists),
+        "lists: ListRecord (get_lists)": _footprint(db.get_lists),
+        "lists: iter_lists (поток)": _footprint(lambda: sum(1 for _ in db.iter_lists())),
+    }
+    if ids["checklists"]:
+        lid = ids["checklists"][0]
+        results.update({
+            "items: sqlite3.Row (прежний get_items)": _footprint(lambda: _old_get_items(lid)),
+            "items: ItemRecord (get_items)": _footprint(lambda: db.get_items(lid)),
+            "items: iter_items (поток)": _footprint(lambda: sum(1 for _ in db.iter_items(lid))),
+        })
+    return results
@@ -0,0 +1,139 @@
+"""Замеры сценариев: функции db.py напрямую и загрузка окон без экрана."""
+import os
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+import db
+from bench.datagen import DatasetSpec, sample_queries
+
+
+def measure(fn: Callable[[], object], repeat: int = 20, warmup: int = 2,
+            setup: Optional[Callable[[], object]] = None) -> Dict[str, float]:
+    """Время fn() в мс по repeat прогонам; setup (не замеряется) выполняется перед каждым."""
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return {
+        "n": repeat,
+        "min_ms": times[0],
+        "median_ms": statistics.median(times),
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "mean_ms": statistics.fmean(times),
+    }
+
+
+def run_db(spec: DatasetSpec, ids: Dict[str, List[int]], repeat: int) -> Dict[str, Dict[str, float]]:
+    rnd = random.Random(spec.seed + 1)
+    checklists = ids["checklists"]
+    results: Dict[str, Dict[str, float]] = {}
+
+    results["get_lists"] = measure(db.get_lists, repeat)
+    for q in sample_queries(spec):
+        results[f"get_lists[query={q}]"] = measure(lambda: db.get_lists(query=q), repeat)
+    if not checklists:
+        return results
+
+    results["get_items"] = measure(lambda: db.get_items(rnd.choice(checklists)), repeat)
+
+    item_ids = [r["id"] for r in db.get_items(checklists[0])]
+    state = {"checked": False}
+
+    def toggle():
+        state["checked"] = not state["checked"]
+        db.set_item_checked(item_ids[0], state["checked"])
+    results["set_item_checked"] = measure(toggle, repeat)
+
+    target = checklists[-1]
+    target_items = [r["id"] for r in db.get_items(target)]
+    results["uncheck_checked_items"] = measure(
+        lambda: db.uncheck_checked_items(target), repeat,
+        setup=lambda: db.set_items_checked(target_items[::2], True))
+
+    texts = [f"bench item {i}" for i in range(spec.items)]
+    results["create_list"] = measure(lambda: db.create_list("bench", texts), repeat)
+    return results
+
+
+# Профили соединения для `python -m bench profile`: текущий db.CONNECTION_PROFILE и
+# умолчания SQLite для тех PRAGMA, которые он меняет (так база открывалась до WAL).
+# Остальное (foreign_keys, busy_timeout, auto_vacuum) одинаково, чтобы сравнивалась только запись.
+LEGACY_PROFILE_OVERRIDES = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "cache_size": -2000,
+    "mmap_size": 0,
+    "temp_store": "DEFAULT",
+}
+
+
+def connection_profiles() -> Dict[str, Dict[str, object]]:
+    return {"legacy": {**db.CONNECTION_PROFILE, **LEGACY_PROFILE_OVERRIDES},
+            "current": dict(db.CONNECTION_PROFILE)}
+
+
+def run_writes(ids: Dict[str, List[int]], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Одиночные записи с коммитом на каждую — то, что меняет профиль соединения."""
+    results: Dict[str, Dict[str, float]] = {}
+    if not ids["checklists"]:
+        return results
+    target = ids["checklists"][0]
+    item_id = db.get_items(target)[0]["id"]
+    state = {"checked": False}
+
+    def toggle():
+        state["checked"] = not state["checked"]
+        db.set_item_checked(item_id, state["checked"])
+    results["set_item_checked"] = measure(toggle, repeat)
+    counter = iter(range(10 ** 9))
+    results["add_item"] = measure(lambda: db.add_item(target, f"bench item {next(counter)}"), repeat)
+    return results
+
+
+def run_gui(spec: DatasetSpec, ids: Dict[str, List[int]], repeat: int) -> Dict[str, Dict[str, float]]:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtCore import QEventLoop, QTimer
+    from PySide6.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    service = main.data_service()
+    results: Dict[str, Dict[str, float]] = {}
+
+    home = main.HomeWindow()
+
+    def reload_home():
+        # _reload_table асинхронный: ждём, пока первая страница попадёт в модель
+        loop = QEventLoop()
+        home.model.modelReset.connect(loop.quit)
+        QTimer.singleShot(10_000, loop.quit)
+        home._reload_table()
+        loop.exec()
+        home.model.modelReset.disconnect(loop.quit)
+    results["HomeWindow._reload_table"] = measure(reload_home, repeat)
+
+    for kind in ("checklists", "notes"):
+        if not ids[kind]:
+            continue
+        win = main.ListWindow(ids[kind][0], home)
+        service.wait_idle()
+
+        def load(win=win):
+            win._load_data()
+            service.wait_idle()
+        results[f"ListWindow._load_data[{kind}]"] = measure(load, repeat)
+        win._exit_on_close = False
+        win.close()
+
+    home.search.stop()
+    service.wait_idle()
+    app.processEvents()
+    return results
@@ -0,0 +1,417 @@
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Set
+
+from PySide6.QtCore import QObject, Signal, QCoreApplication, QEvent, QTimer
+
+import backup
+import db
+
+
+class DataService(QObject):
+    """
+    Вся работа с SQLite вне GUI-потока.
+
+    Чтения идут в небольшой пул потоков (в WAL они не мешают друг другу и писателю),
+    записи — в единственный поток-писатель, поэтому сериализуются сами собой.
+    У каждого потока своё соединение (db.get_conn хранит его в thread-local).
+
+    Долгие задачи на собственных соединениях (резервная копия) идут в отдельный
+    поток background(), чтобы не занимать ни читателей, ни писателя.
+
+    read()/write()/background() возвращают concurrent.futures.Future; если передан callback,
+    он вызывается с результатом в GUI-потоке. Ошибки приходят сигналом failed,
+    а если передан errback — ещё и ему (тоже в GUI-потоке).
+    """
+    failed = Signal(object)           # исключение из фоновой задачи
+    _deliver = Signal(object, object)  # ((callback, errback), future) — из рабочих потоков в GUI
+
+    def __init__(self, readers: int = 2, parent=None):
+        super().__init__(parent)
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="db-write")
+        self._background = ThreadPoolExecutor(1, thread_name_prefix="db-background")
+        self.closing = threading.Event()  # выставляется при выходе; долгие задачи проверяют его между шагами
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._deliver.connect(self._on_deliver)
+
+    def read(self, fn: Callable, *args, callback: Optional[Callable] = None,
+             errback: Optional[Callable] = None, **kwargs) -> Future:
+        return self._submit(self._readers, fn, args, kwargs, (callback, errback))
+
+    def write(self, fn: Callable, *args, callback: Optional[Callable] = None,
+              errback: Optional[Callable] = None, **kwargs) -> Future:
+        return self._submit(self._writer, fn, args, kwargs, (callback, errback))
+
+    def background(self, fn: Callable, *args, callback: Optional[Callable] = None,
+                   errback: Optional[Callable] = None, **kwargs) -> Future:
+        return self._submit(self._background, fn, args, kwargs, (callback, errback))
+
+    def _submit(self, executor, fn, args, kwargs, callbacks) -> Future:
+        fut = executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._pending.add(fut)
+        fut.add_done_callback(lambda f: self._deliver.emit(callbacks, f))
+        return fut
+
+    def _on_deliver(self, callbacks, fut: Future):
+        with self._lock:
+            self._pending.discard(fut)
+        if fut.cancelled():
+            return
+        callback, errback = callbacks
+        exc = fut.exception()
+        if exc is not None:
+            traceback.print_exception(type(exc), exc, exc.__traceback__, file=sys.stderr)
+            self.failed.emit(exc)
+            if errback is not None:
+                errback(exc)
+            return
+        if callback is not None:
+            callback(fut.result())
+
+    def wait_idle(self, timeout: float = 30.0) -> None:
+        """Дождаться всех задач и доставки их результатов (выход из приложения, бенчмарки)."""
+        app = QCoreApplication.instance()
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            wait(pending, timeout=timeout)
+            if app is not None:
+                app.processEvents()
+
+    def shutdown(self) -> None:
+        self.closing.set()
+        self.wait_idle()
+        self._writer.submit(db.close_conn).result()
+        self._writer.shutdown(wait=True)
+        self._background.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+
+_service: Optional[DataService] = None
+
+
+def data_service() -> DataService:
+    """Общий экземпляр сервиса (создаётся в GUI-потоке при первом обращении)."""
+    global _service
+    if _service is None:
+        _service = DataService()
+    return _service
+
+
+# ---------- Отложенная запись галочек ----------
+TOGGLE_FLUSH_MS = 300  # сколько копить переключения перед записью
+TOGGLE_RETRY_MAX_MS = 10_000  # предел паузы перед повтором неудачной записи (пауза удваивается)
+
+
+class ToggleBuffer(QObject):
+    """
+    Write-behind для галочек: переключения копятся в памяти, повторные щелчки
+    по одному пункту схлопываются (вернули как было — записывать нечего),
+    а накопленное уходит в базу одной транзакцией db.set_checked_states
+    через TOGGLE_FLUSH_MS после первого переключения, при закрытии окна и при выходе.
+    После коммита записи переживают падение процесса (WAL, synchronous=NORMAL).
+    Если запись пачки не удалась, пачка возвращается в ожидающие и уходит повторно
+    со следующим сбросом — галочки на экране не выдаются за сохранённые.
+    """
+    flushed = Signal(int, float)  # (пунктов в пачке, задержка записи в мс)
+
+    def __init__(self, service: DataService, delay_ms: int = TOGGLE_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self._service = service
+        self._delay_ms = delay_ms
+        self._failures = 0                    # неудачных записей подряд
+        self._pending: Dict[int, bool] = {}   # item_id -> новое значение
+        self._base: Dict[int, bool] = {}      # item_id -> значение в базе до первого щелчка
+        self._inflight: Dict[int, bool] = {}  # отправлено, но ещё не закоммичено
+        self._timer = QTimer(self); self._timer.setSingleShot(True); self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+        self._stats = {"toggles": 0, "coalesced": 0, "flushes": 0, "items": 0, "failed": 0,
+                       "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+
+    def set_checked(self, item_id: int, checked: bool):
+        self._stats["toggles"] += 1
+        if item_id not in self._pending:
+            self._base[item_id] = self.state(item_id, not checked)
+        if self._base[item_id] == checked:
+            # щелчок отменил предыдущий — в базе уже то, что нужно
+            self._pending.pop(item_id, None); self._base.pop(item_id)
+            self._stats["coalesced"] += 1
+            return
+        self._pending[item_id] = checked
+        if not self._timer.isActive():
+            self._timer.start()  # отсчёт от первого щелчка, чтобы частые клики не откладывали запись бесконечно
+
+    def state(self, item_id: int, default: bool) -> bool:
+        """Значение галочки с учётом ещё не записанных переключений."""
+        if item_id in self._pending:
+            return self._pending[item_id]
+        return self._inflight.get(item_id, default)
+
+    def overlay(self, rows) -> list:
+        """Строки пунктов из базы с наложенными несохранёнными галочками."""
+        if not self._pending and not self._inflight:
+            return list(rows)
+        return [{**dict(r), "checked": self.state(r["id"], bool(r["checked"]))} for r in rows]
+
+    def flush(self) -> Optional[Future]:
+        """Отправить накопленное писателю; Future завершится после коммита."""
+        self._timer.stop()
+        if not self._pending:
+            return None
+        batch, self._pending, self._base = self._pending, {}, {}
+        self._inflight.update(batch)
+        queued = time.perf_counter()
+        return self._service.write(db.set_checked_states, batch,
+                                   callback=lambda _changed: self._on_flushed(batch, queued),
+                                   errback=lambda _exc: self._on_flush_failed(batch))
+
+    def _on_flush_failed(self, batch: Dict[int, bool]):
+        for iid, checked in batch.items():
+            if self._inflight.get(iid) == checked:
+                del self._inflight[iid]
+            if iid not in self._pending:  # пункт уже переключили заново — новое значение важнее
+                self._pending[iid], self._base[iid] = checked, not checked
+        self._stats["failed"] += 1
+        self._failures += 1
+        # повтор с растущей паузой: пока база недоступна, не долбим её (и окно ошибок) каждые 300 мс
+        self._timer.start(min(self._delay_ms << self._failures, TOGGLE_RETRY_MAX_MS))
+
+    def _on_flushed(self, batch: Dict[int, bool], queued: float):
+        if self._failures:
+            self._failures = 0
+            self._timer.setInterval(self._delay_ms)
+        for iid, checked in batch.items():
+            if self._inflight.get(iid) == checked:
+                del self._inflight[iid]
+        ms = (time.perf_counter() - queued) * 1000
+        st = self._stats
+        st["flushes"] += 1; st["items"] += len(batch)
+        st["total_ms"] += ms; st["last_ms"] = ms; st["max_ms"] = max(st["max_ms"], ms)
+        self.flushed.emit(len(batch), ms)
+
+    def stats(self) -> dict:
+        """Счётчики: переключения, схлопнутые щелчки, пачки, неудачные пачки, пункты и задержки записи (мс)."""
+        st = dict(self._stats)
+        st["avg_ms"] = st["total_ms"] / st["flushes"] if st["flushes"] else 0.0
+        st["pending"] = len(self._pending)
+        return st
+
+
+_toggles: Optional[ToggleBuffer] = None
+
+
+def toggle_buffer() -> ToggleBuffer:
+    global _toggles
+    if _toggles is None:
+        _toggles = ToggleBuffer(data_service())
+    return _toggles
+
+
+# ---------- Обслуживание базы в простое ----------
+MAINTENANCE_IDLE_MS = 60_000          # столько без ввода от пользователя — считаем простоем
+MAINTENANCE_INTERVAL_S = 24 * 3600    # не чаще раза в сутки
+
+
+class MaintenanceScheduler(QObject):
+    """
+    Очистка корзины (db.purge_deleted) и старых событий галочек (db.compact_history),
+    сжатие файла (incremental_vacuum, только для баз с auto_vacuum=INCREMENTAL),
+    обновление статистики (db.optimize) и свежая резервная копия (backup.create_backup,
+    в фоновом потоке сервиса) в простое. Каждый шаг базы — отдельная задача
+    писателя, так что галочки и прочие записи встают между шагами; как только
+    пользователь снова что-то нажал, оставшиеся шаги откладываются до следующего простоя.
+    Ошибка шага обрывает цепочку (errback шага); optimize и отметка времени — не обрывают.
+    """
+    finished = Signal(object)  # отчёт: purged, compacted, freed_pages, reclaimed_bytes, bytes, free_bytes, backup
+
+    INPUT_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel)
+
+    def __init__(self, service: DataService, idle_ms: int = MAINTENANCE_IDLE_MS,
+                 interval_s: int = MAINTENANCE_INTERVAL_S, parent=None):
+        super().__init__(parent)
+        self._service = service
+        self._idle_ms = idle_ms
+        self._interval_s = interval_s
+        self._last_input = time.monotonic()
+        self._running = False
+        self._stopped = False
+        self._report: Dict[str, int] = {}
+        self.last_report: Optional[Dict[str, int]] = None
+        self._poll = QTimer(self); self._poll.setInterval(min(idle_ms, 15_000))
+        self._poll.timeout.connect(self._maybe_start)
+
+    def start(self):
+        QCoreApplication.instance().installEventFilter(self)
+        self._poll.start()
+
+    def stop(self):
+        """При выходе: недоделанные шаги не запускать (продолжатся в следующий раз)."""
+        self._stopped = True
+        self._poll.stop()
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.INPUT_EVENTS:
+            self._last_input = time.monotonic()
+        return False
+
+    def is_idle(self) -> bool:
+        return not self._stopped and (time.monotonic() - self._last_input) * 1000 >= self._idle_ms
+
+    def _maybe_start(self):
+        if self._running or not self.is_idle():
+            return
+        self._running = True
+        self._service.read(db.get_meta, "maintenance_last_run",
+                           callback=self._on_last_run, errback=self._on_failed)
+
+    def _on_last_run(self, value: Optional[str]):
+        if value and time.time() - int(value) < self._interval_s:
+            self._running = False; return
+        self._service.write(db.storage_info, callback=self._begin, errback=self._on_failed)
+
+    def _begin(self, info: Dict[str, int]):
+        self._report = {"purged": 0, "compacted": 0, "freed_pages": 0, "bytes_before": info["bytes"]}
+        self._purge_step()
+
+    def _purge_step(self):
+        if not self.is_idle():
+            self._running = False; return
+        self._service.write(db.purge_deleted, callback=self._on_purged, errback=self._on_failed)
+
+    def _on_purged(self, n: int):
+        self._report["purged"] += n
+        if n:
+            self._purge_step()
+        else:
+            self._compact_step()
+
+    def _compact_step(self):
+        if not self.is_idle():
+            self._running = False; return
+        self._service.write(db.compact_history, callback=self._on_compacted, errback=self._on_failed)
+
+    def _on_compacted(self, n: int):
+        self._report["compacted"] += n
+        if n:
+            self._compact_step()
+        else:
+            self._vacuum_step()
+
+    def _vacuum_step(self):
+        if not self.is_idle():
+            self._running = False; return
+        self._service.write(db.incremental_vacuum, callback=self._on_vacuumed, errback=self._on_failed)
+
+    def _on_vacuumed(self, freed: int):
+        self._report["freed_pages"] += freed
+        if freed:
+            self._vacuum_step()
+        else:
+            self._service.write(db.optimize)
+            self._service.write(db.storage_info, callback=self._finish, errback=self._on_failed)
+
+    def _finish(self, info: Dict[str, int]):
+        self._service.write(db.set_meta, "maintenance_last_run", str(int(time.time())))
+        report = self._report
+        report["reclaimed_bytes"] = max(0, report.pop("bytes_before") - info["bytes"])
+        report["bytes"] = info["bytes"]
+        # база без auto_vacuum (создана до его включения) не сжимается в простое — полный VACUUM
+        # занял бы писателя надолго; показываем, сколько места в ней свободно
+        report["free_bytes"] = info["freelist_count"] * info["page_size"]
+        # копия уже сжатой базы; снимается на своём соединении и записям не мешает
+        self._service.background(backup.create_backup, cancelled=self._service.closing.is_set,
+                                 callback=self._on_backup, errback=self._on_failed)
+
+    def _on_backup(self, result: Dict):
+        report = self._report
+        report["backup"] = result["path"]
+        self.last_report = report
+        self._running = False
+        self.finished.emit(report)
+
+    def _on_failed(self, _exc):
+        # errback шагов цепочки (не общий сигнал failed: чужая ошибка — галочки, поиск —
+        # не должна снимать _running посреди цепочки и давать простою запустить вторую)
+        self._running = False  # следующая попытка — в следующий простой
+
+
+_maintenance: Optional[MaintenanceScheduler] = None
+
+
+def maintenance_scheduler() -> MaintenanceScheduler:
+    global _maintenance
+    if _maintenance is None:
+        _maintenance = MaintenanceScheduler(data_service())
+    return _maintenance
+
+
+# ---------- Сброс повторяющихся чеклистов ----------
+RESET_RECHECK_MS = 3_600_000  # дольше часа не спим: сон компьютера, перевод часов, новые правила
+
+
+class RecurrenceScheduler(QObject):
+    """
+    Снимает галочки в повторяющихся списках в начале суток: при запуске (если граница
+    суток прошла, пока приложение было закрыто) и по таймеру до ближайшего next_reset_at.
+    Все созревшие списки сбрасываются одной задачей писателя (db.reset_due_lists);
+    перед ней уходят накопленные в ToggleBuffer щелчки, чтобы не перезаписать сброс.
+    """
+    lists_reset = Signal(object)  # id сброшенных списков
+
+    def __init__(self, service: DataService, toggles: ToggleBuffer, parent=None):
+        super().__init__(parent)
+        self._service = service
+        self._toggles = toggles
+        self._stopped = False
+        self._timer = QTimer(self); self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._reset)
+
+    def start(self):
+        self._reset()
+
+    def stop(self):
+        self._stopped = True
+        self._timer.stop()
+
+    def reschedule(self):
+        """Перечитать ближайший срок (после смены правила у списка)."""
+        self._service.read(db.get_next_reset, callback=self._schedule)
+
+    def _reset(self):
+        self._toggles.flush()
+        self._service.write(db.reset_due_lists, callback=self._on_reset)
+
+    def _on_reset(self, list_ids: List[int]):
+        if list_ids:
+            self.lists_reset.emit(list_ids)
+        self.reschedule()
+
+    def _schedule(self, next_at: Optional[str]):
+        if self._stopped:
+            return
+        delay = RESET_RECHECK_MS
+        if next_at:
+            due = datetime.strptime(next_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            # +1 с: сравнение в базе идёт с точностью до секунды
+            ms = (due - datetime.now(timezone.utc)).total_seconds() * 1000 + 1000
+            delay = int(min(max(ms, 0), RESET_RECHECK_MS))
+        self._timer.start(delay)
+
+
+_recurrence: Optional[RecurrenceScheduler] = None
+
+
+def recurrence_scheduler() -> RecurrenceScheduler:
+    global _recurrence
+    if _recurrence is None:
+        _recurrence = RecurrenceScheduler(data_service(), toggle_buffer())
+    return _recurrence
@@ -1,22 +1,108 @@
+import base64
+import datetime
+import functools
+import itertools
+import json
 import os
 import sqlite3
-from typing import List, Optional, Iterable, Dict
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import List, Optional, Iterable, Iterator, Dict, Tuple, Callable, NamedTuple, FrozenSet
 
 _DB_PATH = os.path.join(os.path.expanduser("~"), "AppData", "Roaming", "ChecklistNotes", "app.db") if os.name == "nt" \
     else os.path.join(os.path.expanduser("~"), ".local", "share", "ChecklistNotes", "app.db")
 
-_conn: Optional[sqlite3.Connection] = None
+# Соединение своё у каждого потока (GUI и фоновые воркеры): sqlite3.Connection
+# нельзя делить между потоками, а в WAL читатели не мешают писателю.
+# В _local также лежит вложенность transaction() для этого соединения.
+_local = threading.local()
+
+# PRAGMA, применяемые к каждому новому соединению (менять до первого get_conn).
+# WAL + synchronous=NORMAL: коммит без fsync журнала на каждую галочку,
+# читатели не блокируют писателя; данные не теряются при падении процесса.
+CONNECTION_PROFILE: Dict[str, object] = {
+    "auto_vacuum": "INCREMENTAL",    # действует только для новой базы; старые переводит enable_incremental_vacuum()
+    "analysis_limit": 400,           # ANALYZE и PRAGMA optimize читают выборку строк, а не индексы целиком
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16384,            # в КиБ, т.е. ~16 МБ
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",            # ON DELETE CASCADE у items
+    "busy_timeout": 5000,            # мс
+}
+
+
+def _apply_profile(conn: sqlite3.Connection) -> None:
+    for pragma, value in CONNECTION_PROFILE.items():
+        conn.execute(f"PRAGMA {pragma}={value}").fetchall()
 
 
 def get_conn() -> sqlite3.Connection:
-    global _conn
-    if _conn:
-        return _conn
+    """Соединение текущего потока; создаётся при первом обращении."""
+    conn = getattr(_local, "conn", None)
+    if conn:
+        if _local.trace_gen != _trace_gen:
+            _sync_trace(conn)
+        return conn
     os.makedirs(os.path.dirname(_DB_PATH), exist_ok=True)
-    _conn = sqlite3.connect(_DB_PATH)
-    _conn.row_factory = sqlite3.Row
-    init_db(_conn)
-    return _conn
+    conn = sqlite3.connect(_DB_PATH)
+    conn.row_factory = sqlite3.Row
+    _apply_profile(conn)
+    init_db(conn)
+    _local.conn = conn
+    _local.tx_depth = 0
+    _local.pending = []
+    _sync_trace(conn)
+    return conn
+
+
+def set_db_path(path: str) -> None:
+    """
+    Переключает файл базы (временная база для бенчмарков и проверок).
+    Соединение текущего потока закрывается; соединения других потоков
+    нужно закрыть их владельцам — вызывать до запуска фоновых потоков.
+    """
+    global _DB_PATH
+    close_conn()
+    _DB_PATH = os.path.abspath(path)
+
+
+def get_db_path() -> str:
+    return _DB_PATH
+
+
+def has_conn() -> bool:
+    """Открыто ли уже соединение в текущем потоке."""
+    return getattr(_local, "conn", None) is not None
+
+
+def close_conn() -> None:
+    """Закрывает соединение текущего потока (при остановке фонового воркера)."""
+    conn = getattr(_local, "conn", None)
+    if conn:
+        _local.conn = None
+        conn.close()
+
+
+def checkpoint(truncate: bool = False) -> None:
+    """
+    Обслуживание в «безопасной точке» (закрытие окна, выход): перенос WAL
+    в основной файл и PRAGMA optimize. truncate=True дополнительно
+    обрезает -wal файл (при выходе из приложения).
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        return
+    conn.execute(f"PRAGMA wal_checkpoint({'TRUNCATE' if truncate else 'PASSIVE'})").fetchall()
+    conn.execute("PRAGMA optimize")
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (name,))
+    return cur.fetchone() is not None
 
 
 def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
@@ -24,8 +110,29 @@ def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
     return any(r["name"] == column for r in cur.fetchall())
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    conn.executescript("""
+def _exec_script(conn: sqlite3.Connection, script: str) -> None:
+    """
+    Аналог executescript без неявного COMMIT: выполняет инструкции по одной,
+    чтобы миграция целиком оставалась внутри своей транзакции.
+    """
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            conn.execute(buf)
+            buf = ""
+    if buf.strip():
+        conn.execute(buf)
+
+
+# ---------- Миграции схемы ----------
+# Каждая миграция выполняется один раз в своей транзакции, номер последней
+# применённой хранится в PRAGMA user_version. Базы, созданные до появления
+# версий (user_version = 0), уже могут содержать часть изменений, поэтому
+# шаги написаны идемпотентно.
+
+def _m_base_schema(conn: sqlite3.Connection) -> None:
+    _exec_script(conn, """
     CREATE TABLE IF NOT EXISTS lists (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         title TEXT NOT NULL,
@@ -39,7 +146,6 @@ def init_db(conn: sqlite3.Connection) -> None:
         FOREIGN KEY(list_id) REFERENCES lists(id) ON DELETE CASCADE
     );
     """)
-    # миграции
     if not _column_exists(conn, "lists", "updated_at"):
         conn.execute("ALTER TABLE lists ADD COLUMN updated_at TIMESTAMP")
         conn.execute("UPDATE lists SET updated_at = created_at WHERE updated_at IS NULL")
@@ -56,18 +162,550 @@ def init_db(conn: sqlite3.Connection) -> None:
         conn.execute("ALTER TABLE lists ADD COLUMN kind TEXT NOT NULL DEFAULT 'checklist'")
     if not _column_exists(conn, "lists", "note_text"):
         conn.execute("ALTER TABLE lists ADD COLUMN note_text TEXT")
-
-    # индексы для ускорения поиска
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_lists_title ON lists(title)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_lists_note_text ON lists(note_text)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_items_list_text ON items(list_id, text)")
-    conn.commit()
 
 
-def _touch_updated(list_id: int):
+def _m_search_fts(conn: sqlite3.Connection) -> None:
+    # B-tree не обслуживает LIKE '%q%', поиск идёт через search_fts
+    conn.execute("DROP INDEX IF EXISTS idx_lists_title")
+    conn.execute("DROP INDEX IF EXISTS idx_lists_note_text")
+    if not _table_exists(conn, "search_fts"):
+        _create_search_index(conn)
+
+
+def _m_item_counters(conn: sqlite3.Connection) -> None:
+    # денормализованные счётчики пунктов (ведутся триггерами)
+    if not _column_exists(conn, "lists", "item_count"):
+        conn.execute("ALTER TABLE lists ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0")
+        conn.execute("ALTER TABLE lists ADD COLUMN done_count INTEGER NOT NULL DEFAULT 0")
+        _create_counter_triggers(conn)
+        _recount(conn)
+
+
+def _m_home_sort_index(conn: sqlite3.Connection) -> None:
+    # Сортировка по COALESCE(updated_at, created_at) не даёт индексу искать с позиции
+    # курсора, поэтому гарантируем заполненные created_at/updated_at и сортируем по столбцам.
+    conn.execute("UPDATE lists SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    conn.execute("UPDATE lists SET updated_at = created_at WHERE updated_at IS NULL")
+    _exec_script(conn, """
+    CREATE TRIGGER IF NOT EXISTS trg_lists_updated_at_ins AFTER INSERT ON lists
+    WHEN new.updated_at IS NULL OR new.created_at IS NULL BEGIN
+        UPDATE lists SET created_at = COALESCE(new.created_at, CURRENT_TIMESTAMP),
+                         updated_at = COALESCE(new.updated_at, new.created_at, CURRENT_TIMESTAMP)
+        WHERE id = new.id;
+    END;
+    CREATE INDEX IF NOT EXISTS idx_lists_home
+        ON lists(pinned DESC, updated_at DESC, created_at DESC, id DESC)
+        WHERE archived = 0 AND deleted_at IS NULL;
+    """)
+
+
+def _m_notes_table(conn: sqlite3.Connection) -> None:
+    # Тексты заметок уезжают из «горячей» строки lists в отдельную таблицу:
+    # листинг больше не тащит тела заметок, а читаются они только при открытии.
+    _exec_script(conn, """
+    CREATE TABLE IF NOT EXISTS notes (
+        list_id INTEGER PRIMARY KEY REFERENCES lists(id) ON DELETE CASCADE,
+        body TEXT NOT NULL
+    );
+    INSERT OR IGNORE INTO notes (list_id, body)
+        SELECT id, note_text FROM lists WHERE note_text IS NOT NULL;
+
+    DROP TRIGGER IF EXISTS trg_lists_fts_ins;
+    DROP TRIGGER IF EXISTS trg_lists_fts_upd;
+    CREATE TRIGGER trg_lists_fts_ins AFTER INSERT ON lists BEGIN
+        INSERT INTO search_fts(rowid, body, list_id) VALUES (-new.id, new.title, new.id);
+    END;
+    CREATE TRIGGER trg_lists_fts_upd AFTER UPDATE OF title ON lists BEGIN
+        DELETE FROM search_fts WHERE rowid = -old.id;
+        INSERT INTO search_fts(rowid, body, list_id)
+        VALUES (-new.id, new.title || char(10) || COALESCE((SELECT body FROM notes WHERE list_id = new.id), ''), new.id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_notes_fts_ins AFTER INSERT ON notes BEGIN
+        DELETE FROM search_fts WHERE rowid = -new.list_id;
+        INSERT INTO search_fts(rowid, body, list_id)
+        SELECT -id, title || char(10) || new.body, id FROM lists WHERE id = new.list_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_notes_fts_upd AFTER UPDATE OF body ON notes BEGIN
+        DELETE FROM search_fts WHERE rowid = -new.list_id;
+        INSERT INTO search_fts(rowid, body, list_id)
+        SELECT -id, title || char(10) || new.body, id FROM lists WHERE id = new.list_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_notes_fts_del AFTER DELETE ON notes BEGIN
+        DELETE FROM search_fts WHERE rowid = -old.list_id;
+        INSERT INTO search_fts(rowid, body, list_id)
+        SELECT -id, title, id FROM lists WHERE id = old.list_id;
+    END;
+    """)
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute("ALTER TABLE lists DROP COLUMN note_text")
+    else:
+        conn.execute("UPDATE lists SET note_text = NULL WHERE note_text IS NOT NULL")
+
+
+def _m_maintenance(conn: sqlite3.Connection) -> None:
+    # служебные отметки (когда было обслуживание и т.п.) и быстрый поиск старого мусора в корзине
+    _exec_script(conn, """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_lists_deleted ON lists(deleted_at) WHERE deleted_at IS NOT NULL;
+    """)
+
+
+def _m_import_ids(conn: sqlite3.Connection) -> None:
+    # соответствие id из файла импорта и новых id: нужно, чтобы продолжить прерванный импорт
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS import_ids (
+        job TEXT NOT NULL,
+        old_id INTEGER NOT NULL,
+        new_id INTEGER NOT NULL,
+        PRIMARY KEY (job, old_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _m_recurrence(conn: sqlite3.Connection) -> None:
+    # повторяющиеся чеклисты: правило и момент следующего сброса (UTC, как CURRENT_TIMESTAMP);
+    # частичный индекс содержит только повторяющиеся списки, так что поиск «кого пора
+    # сбрасывать» не зависит от общего числа списков
+    if not _column_exists(conn, "lists", "recurrence"):
+        conn.execute("ALTER TABLE lists ADD COLUMN recurrence TEXT")
+        conn.execute("ALTER TABLE lists ADD COLUMN next_reset_at TIMESTAMP")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lists_next_reset ON lists(next_reset_at) "
+                 "WHERE next_reset_at IS NOT NULL")
+
+
+def _m_completion_history(conn: sqlite3.Connection) -> None:
+    # История галочек: сырые события (только дописываются, старые удаляет compact_history)
+    # и сводка по спискам и дням, которую тот же триггер ведёт на лету, —
+    # статистика за год читает не больше 366 строк сводки на список.
+    _exec_script(conn, """
+    CREATE TABLE IF NOT EXISTS check_events (
+        id INTEGER PRIMARY KEY,
+        item_id INTEGER NOT NULL,
+        list_id INTEGER NOT NULL,
+        checked INTEGER NOT NULL,
+        at INTEGER NOT NULL             -- unix-время, UTC
+    );
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        list_id INTEGER NOT NULL,
+        day TEXT NOT NULL,              -- местная дата YYYY-MM-DD
+        checks INTEGER NOT NULL DEFAULT 0,
+        unchecks INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (list_id, day)
+    ) WITHOUT ROWID;
+    CREATE TRIGGER IF NOT EXISTS trg_items_history AFTER UPDATE OF checked ON items
+    WHEN (old.checked != 0) != (new.checked != 0) BEGIN
+        INSERT INTO check_events (item_id, list_id, checked, at)
+        VALUES (new.id, new.list_id, new.checked != 0, CAST(strftime('%s', 'now') AS INTEGER));
+        INSERT INTO daily_stats (list_id, day, checks, unchecks)
+        VALUES (new.list_id, date('now', 'localtime'), new.checked != 0, new.checked = 0)
+        ON CONFLICT (list_id, day) DO UPDATE
+            SET checks = checks + excluded.checks, unchecks = unchecks + excluded.unchecks;
+    END;
+    """)
+
+
+def _m_item_positions(conn: sqlite3.Connection) -> None:
+    # ручной порядок пунктов: дробная позиция, перенос пункта меняет одну строку (см. move_item);
+    # исходный порядок (по id) сохраняется
+    if not _column_exists(conn, "items", "position"):
+        conn.execute("ALTER TABLE items ADD COLUMN position REAL")
+        conn.execute("UPDATE items SET position = id")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_list_position ON items(list_id, position)")
+
+
+def _m_history_guard(conn: sqlite3.Connection) -> None:
+    # Системный сброс галочек (reset_due_lists) — не действие пользователя: на время своей
+    # транзакции он кладёт в meta ключ history_paused, и триггер истории его пропускает.
+    # Ключ живёт только внутри транзакции писателя, другие соединения его не видят.
+    _exec_script(conn, """
+    DROP TRIGGER IF EXISTS trg_items_history;
+    CREATE TRIGGER trg_items_history AFTER UPDATE OF checked ON items
+    WHEN (old.checked != 0) != (new.checked != 0)
+         AND NOT EXISTS (SELECT 1 FROM meta WHERE key = 'history_paused') BEGIN
+        INSERT INTO check_events (item_id, list_id, checked, at)
+        VALUES (new.id, new.list_id, new.checked != 0, CAST(strftime('%s', 'now') AS INTEGER));
+        INSERT INTO daily_stats (list_id, day, checks, unchecks)
+        VALUES (new.list_id, date('now', 'localtime'), new.checked != 0, new.checked = 0)
+        ON CONFLICT (list_id, day) DO UPDATE
+            SET checks = checks + excluded.checks, unchecks = unchecks + excluded.unchecks;
+    END;
+    """)
+
+
+def _m_bulk_insert_guard(conn: sqlite3.Connection) -> None:
+    # Массовая вставка пунктов (_bulk_insert_items) отключала построчные триггеры FTS и счётчиков
+    # через DROP/CREATE TRIGGER — DDL меняет schema cookie, и каждое открытое соединение после
+    # каждой пачки импорта заново разбирало схему. Теперь триггеры пропускают строки, пока
+    # в meta лежит ключ bulk_items (он существует только внутри транзакции писателя).
+    _exec_script(conn, """
+    DROP TRIGGER IF EXISTS trg_items_fts_ins;
+    CREATE TRIGGER trg_items_fts_ins AFTER INSERT ON items
+    WHEN NOT EXISTS (SELECT 1 FROM meta WHERE key = 'bulk_items') BEGIN
+        INSERT INTO search_fts(rowid, body, list_id) VALUES (new.id, new.text, new.list_id);
+    END;
+    DROP TRIGGER IF EXISTS trg_items_cnt_ins;
+    CREATE TRIGGER trg_items_cnt_ins AFTER INSERT ON items
+    WHEN NOT EXISTS (SELECT 1 FROM meta WHERE key = 'bulk_items') BEGIN
+        UPDATE lists SET item_count = item_count + 1, done_count = done_count + (new.checked != 0)
+        WHERE id = new.list_id;
+    END;
+    """)
+
+
+# порядок важен: user_version = число применённых шагов
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Connection], None]]] = [
+    ("base_schema", _m_base_schema),
+    ("search_fts", _m_search_fts),
+    ("item_counters", _m_item_counters),
+    ("home_sort_index", _m_home_sort_index),
+    ("notes_table", _m_notes_table),
+    ("maintenance", _m_maintenance),
+    ("import_ids", _m_import_ids),
+    ("recurrence", _m_recurrence),
+    ("completion_history", _m_completion_history),
+    ("item_positions", _m_item_positions),
+    ("history_guard", _m_history_guard),
+    ("bulk_insert_guard", _m_bulk_insert_guard),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# (версия, имя, секунды) миграций, выполненных при последнем init_db
+_last_migrations: List[Tuple[int, str, float]] = []
+
+
+def init_db(conn: sqlite3.Connection) -> List[Tuple[int, str, float]]:
+    """
+    Доводит схему до SCHEMA_VERSION. Для актуальной базы это одно чтение
+    PRAGMA user_version. Возвращает список выполненных миграций
+    (версия, имя, длительность в секундах).
+    """
+    global _last_migrations
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"База данных новее приложения (версия схемы {version} > {SCHEMA_VERSION})")
+    applied = []
+    while version < SCHEMA_VERSION:
+        started = time.perf_counter()
+        ran = None
+        # IMMEDIATE + повторное чтение версии: если соединение другого потока
+        # успело применить шаг, пока мы ждали блокировку, не повторяем его
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                ran, step = MIGRATIONS[version]
+                step(conn)
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if ran:
+            applied.append((version, ran, time.perf_counter() - started))
+    _last_migrations = applied
+    return applied
+
+
+def migration_report() -> List[Tuple[int, str, float]]:
+    """Миграции, выполненные при открытии текущей базы: (версия, имя, секунды)."""
+    get_conn()
+    return list(_last_migrations)
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    """
+    Полнотекстовый индекс (FTS5, trigram) по названиям, пунктам и текстам заметок.
+    Одна строка на документ: rowid = -lists.id для названия+текста заметки,
+    rowid = items.id для пункта. Триграммы дают поиск по подстроке,
+    case_sensitive=0 складывает регистр по Юникоду (кириллица тоже).
+    """
+    _exec_script(conn, """
+    CREATE VIRTUAL TABLE search_fts USING fts5(
+        body, list_id UNINDEXED, tokenize='trigram case_sensitive 0'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_lists_fts_ins AFTER INSERT ON lists BEGIN
+        INSERT INTO search_fts(rowid, body, list_id)
+        VALUES (-new.id, new.title || char(10) || COALESCE(new.note_text, ''), new.id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_lists_fts_upd AFTER UPDATE OF title, note_text ON lists BEGIN
+        DELETE FROM search_fts WHERE rowid = -old.id;
+        INSERT INTO search_fts(rowid, body, list_id)
+        VALUES (-new.id, new.title || char(10) || COALESCE(new.note_text, ''), new.id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_lists_fts_del AFTER DELETE ON lists BEGIN
+        DELETE FROM search_fts WHERE rowid = -old.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_ins AFTER INSERT ON items BEGIN
+        INSERT INTO search_fts(rowid, body, list_id) VALUES (new.id, new.text, new.list_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_upd AFTER UPDATE OF text, list_id ON items BEGIN
+        DELETE FROM search_fts WHERE rowid = old.id;
+        INSERT INTO search_fts(rowid, body, list_id) VALUES (new.id, new.text, new.list_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_del AFTER DELETE ON items BEGIN
+        DELETE FROM search_fts WHERE rowid = old.id;
+    END;
+
+    INSERT INTO search_fts(rowid, body, list_id)
+        SELECT -id, title || char(10) || COALESCE(note_text, ''), id FROM lists;
+    INSERT INTO search_fts(rowid, body, list_id)
+        SELECT id, text, list_id FROM items;
+    """)
+
+
+def _create_counter_triggers(conn: sqlite3.Connection) -> None:
+    _exec_script(conn, """
+    CREATE TRIGGER IF NOT EXISTS trg_items_cnt_ins AFTER INSERT ON items BEGIN
+        UPDATE lists SET item_count = item_count + 1, done_count = done_count + (new.checked != 0)
+        WHERE id = new.list_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_cnt_del AFTER DELETE ON items BEGIN
+        UPDATE lists SET item_count = item_count - 1, done_count = done_count - (old.checked != 0)
+        WHERE id = old.list_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_items_cnt_upd AFTER UPDATE OF checked, list_id ON items
+    WHEN old.list_id != new.list_id OR (old.checked != 0) != (new.checked != 0) BEGIN
+        UPDATE lists SET item_count = item_count - 1, done_count = done_count - (old.checked != 0)
+        WHERE id = old.list_id;
+        UPDATE lists SET item_count = item_count + 1, done_count = done_count + (new.checked != 0)
+        WHERE id = new.list_id;
+    END;
+    """)
+
+
+def _recount(conn: sqlite3.Connection, list_ids: Optional[List[int]] = None) -> None:
+    sql = """
+    UPDATE lists SET
+      item_count = (SELECT COUNT(*) FROM items i WHERE i.list_id = lists.id),
+      done_count = (SELECT COUNT(*) FROM items i WHERE i.list_id = lists.id AND i.checked != 0)
+    """
+    if list_ids is None:
+        conn.execute(sql)
+    else:
+        conn.executemany(sql + " WHERE id = ?", [(lid,) for lid in list_ids])
+
+
+def check_counters(repair: bool = False) -> List[int]:
+    """
+    Сверяет lists.item_count / done_count с фактическим содержимым items.
+    Возвращает id списков с расхождениями; при repair=True пересчитывает их.
+    """
+    conn = get_conn()
+    cur = conn.execute("""
+    SELECT l.id FROM lists l
+    LEFT JOIN (
+        SELECT list_id, COUNT(*) AS n, SUM(checked != 0) AS d FROM items GROUP BY list_id
+    ) c ON c.list_id = l.id
+    WHERE l.item_count != COALESCE(c.n, 0) OR l.done_count != COALESCE(c.d, 0)
+    """)
+    bad = [r["id"] for r in cur.fetchall()]
+    if repair and bad:
+        with transaction() as conn:
+            _recount(conn, bad)
+            for list_id in bad:
+                _emit(LIST_CHANGED, list_id)
+    return bad
+
+
+def _fts_phrase(q: str) -> str:
+    # фраза в кавычках: триграммы ищут её как подстроку, спецсимволы MATCH не мешают
+    return '"' + q.replace('"', '""') + '"'
+
+
+# ---------- Уведомления об изменениях ----------
+# Мутации копят события в своей транзакции; после COMMIT они склеиваются
+# (одно событие на вид+список) и раздаются подписчикам списком, в том потоке,
+# который сделал коммит. При откате события отбрасываются.
+LIST_CREATED = "list_created"
+LIST_CHANGED = "list_changed"      # pinned / archived / счётчики
+LIST_DELETED = "list_deleted"
+ITEMS_ADDED = "items_added"
+ITEMS_CHANGED = "items_changed"    # галочки
+ITEMS_DELETED = "items_deleted"
+DATABASE_REPLACED = "database_replaced"  # содержимое базы заменено копией (list_id=0) — перечитать всё
+
+
+class ChangeEvent(NamedTuple):
+    kind: str
+    list_id: int
+    item_ids: FrozenSet[int] = frozenset()
+
+
+_subscribers: List[Callable[[List[ChangeEvent]], None]] = []
+
+
+def subscribe(callback: Callable[[List[ChangeEvent]], None]) -> None:
+    """callback(events) вызывается после каждой зафиксированной транзакции с изменениями."""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[List[ChangeEvent]], None]) -> None:
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def _emit(kind: str, list_id: int, item_ids: Iterable[int] = ()) -> None:
+    _local.pending.append(ChangeEvent(kind, list_id, frozenset(item_ids)))
+
+
+def _coalesce(events: List[ChangeEvent]) -> List[ChangeEvent]:
+    merged: Dict[Tuple[str, int], ChangeEvent] = {}
+    for ev in events:
+        key = (ev.kind, ev.list_id)
+        prev = merged.get(key)
+        merged[key] = ev if prev is None else prev._replace(item_ids=prev.item_ids | ev.item_ids)
+    return list(merged.values())
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Явная транзакция: всё внутри блока фиксируется одним COMMIT
+    или откатывается целиком при исключении. Вложенные блоки
+    присоединяются к внешней транзакции.
+    """
     conn = get_conn()
-    conn.execute("UPDATE lists SET updated_at=CURRENT_TIMESTAMP WHERE id=?", (list_id,))
-    conn.commit()
+    if _local.tx_depth:
+        _local.tx_depth += 1
+        try:
+            yield conn
+        finally:
+            _local.tx_depth -= 1
+        return
+    conn.execute("BEGIN")
+    _local.tx_depth = 1
+    _local.pending = []
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.tx_depth = 0
+        events, _local.pending = _local.pending, []
+    if events:
+        events = _coalesce(events)
+        for callback in list(_subscribers):
+            callback(events)
+
+
+# ---------- Записи результатов ----------
+# Компактные строки вместо dict: __slots__ без словаря атрибутов на объект.
+# Поддерживают и доступ как к словарю (row["title"], row.get, dict(row)),
+# чтобы код, написанный под dict/sqlite3.Row, работал без изменений.
+
+class _Record:
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class ListRecord(_Record):
+    """Строка списка для листингов (колонки _LIST_COLUMNS)."""
+    __slots__ = ("id", "title", "color", "pinned", "archived", "kind",
+                 "created_at", "updated_at", "deleted_at", "item_count", "done_count", "recurrence")
+
+    def __init__(self, id, title, color, pinned, archived, kind,
+                 created_at, updated_at, deleted_at, item_count, done_count, recurrence):
+        self.id = id; self.title = title; self.color = color
+        self.pinned = pinned; self.archived = archived; self.kind = kind
+        self.created_at = created_at; self.updated_at = updated_at; self.deleted_at = deleted_at
+        self.item_count = item_count; self.done_count = done_count; self.recurrence = recurrence
+
+
+class ItemRecord(_Record):
+    """Пункт чеклиста."""
+    __slots__ = ("id", "text", "checked")
+
+    def __init__(self, id, text, checked):
+        self.id = id; self.text = text; self.checked = checked
+
+
+def _list_record(cursor: sqlite3.Cursor, row: tuple) -> ListRecord:
+    return ListRecord(*row)
+
+
+def _item_record(cursor: sqlite3.Cursor, row: tuple) -> ItemRecord:
+    return ItemRecord(*row)
+
+
+FETCH_BATCH = 500  # строк за один fetchmany в iter_lists/iter_items
+
+
+def _stream(cur: sqlite3.Cursor, batch: int) -> Iterator:
+    try:
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cur.close()
+
+
+def _chunks(ids: List[int], size: int = 500) -> Iterator[List[int]]:
+    # держимся ниже лимита SQLite на число параметров запроса
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _touch_updated(conn: sqlite3.Connection, list_ids: Iterable[int]) -> None:
+    conn.executemany("UPDATE lists SET updated_at=CURRENT_TIMESTAMP WHERE id=?", [(lid,) for lid in list_ids])
+
+
+def _last_position(conn: sqlite3.Connection, list_id: int) -> float:
+    return conn.execute("SELECT COALESCE(MAX(position), 0) FROM items WHERE list_id=?", (list_id,)).fetchone()[0]
+
+
+def _with_positions(conn: sqlite3.Connection, rows: List[Tuple[int, str, int]]) -> List[Tuple[int, str, int, float]]:
+    """Дописывает к строкам (list_id, text, checked) позиции в конец своих списков, в порядке строк."""
+    last: Dict[int, float] = {}
+    out = []
+    for list_id, text, checked in rows:
+        pos = last.get(list_id)
+        pos = (_last_position(conn, list_id) if pos is None else pos) + POSITION_STEP
+        last[list_id] = pos
+        out.append((list_id, text, checked, pos))
+    return out
+
+
+def _insert_items(conn: sqlite3.Connection, list_id: int, texts: Iterable[str]) -> List[int]:
+    # при AUTOINCREMENT новые id всегда больше текущего максимума
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+    conn.executemany("INSERT INTO items (list_id, text, checked, position) VALUES (?, ?, ?, ?)",
+                     _with_positions(conn, [(list_id, t, 0) for t in texts]))
+    cur = conn.execute("SELECT id FROM items WHERE list_id=? AND id>? ORDER BY id", (list_id, last_id))
+    return [r[0] for r in cur.fetchall()]
 
 
 def create_list(title: str,
@@ -75,84 +713,374 @@ def create_list(title: str,
                 color: str = "#ffffff",
                 pinned: bool = False,
                 kind: str = "checklist",
-                note_text: Optional[str] = None) -> int:
+                note_text: Optional[str] = None,
+                recurrence: Optional[str] = None) -> int:
     """
     kind: 'checklist' | 'text'
-    Для 'text' – содержимое в note_text.
+    Для 'text' – содержимое в note_text (хранится в таблице notes).
+    recurrence: одно из RECURRENCE_RULES или None (см. set_recurrence).
     """
-    conn = get_conn()
-    cur = conn.execute(
-        "INSERT INTO lists (title, color, pinned, archived, kind, note_text, updated_at) "
-        "VALUES (?, ?, ?, 0, ?, ?, CURRENT_TIMESTAMP)",
-        (title, color, 1 if pinned else 0, kind, note_text)
-    )
-    list_id = cur.lastrowid
-    if kind == "checklist":
-        for t in items:
-            conn.execute("INSERT INTO items (list_id, text, checked) VALUES (?, ?, 0)", (list_id, t))
-    conn.commit()
+    _check_rule(recurrence)
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO lists (title, color, pinned, archived, kind, updated_at, recurrence, next_reset_at) "
+            f"VALUES (?, ?, ?, 0, ?, CURRENT_TIMESTAMP, ?, {_next_reset_sql('?')})",
+            (title, color, 1 if pinned else 0, kind, recurrence, recurrence)
+        )
+        list_id = cur.lastrowid
+        if kind == "checklist":
+            _insert_items(conn, list_id, items)
+        if note_text is not None:
+            conn.execute("INSERT INTO notes (list_id, body) VALUES (?, ?)", (list_id, note_text))
+        _emit(LIST_CREATED, list_id)
     return list_id
 
 
 def add_item(list_id: int, text: str) -> int:
-    conn = get_conn()
-    cur = conn.execute("INSERT INTO items (list_id, text, checked) VALUES (?, ?, 0)", (list_id, text))
-    _touch_updated(list_id)
+    with transaction() as conn:
+        cur = conn.execute("INSERT INTO items (list_id, text, checked, position) VALUES (?, ?, 0, ?)",
+                           (list_id, text, _last_position(conn, list_id) + POSITION_STEP))
+        _touch_updated(conn, [list_id])
+        _emit(ITEMS_ADDED, list_id, [cur.lastrowid])
     return cur.lastrowid
 
 
-def get_items(list_id: int) -> List[sqlite3.Row]:
-    conn = get_conn()
-    cur = conn.execute("SELECT id, text, checked FROM items WHERE list_id=? ORDER BY id", (list_id,))
-    return cur.fetchall()
+def add_items(list_id: int, texts: Iterable[str]) -> List[int]:
+    """Добавляет пункты одной транзакцией; возвращает их id в порядке вставки."""
+    with transaction() as conn:
+        ids = _insert_items(conn, list_id, texts)
+        if ids:
+            _touch_updated(conn, [list_id])
+            _emit(ITEMS_ADDED, list_id, ids)
+    return ids
+
+
+_ITEMS_SQL = "SELECT id, text, checked FROM items WHERE list_id=? ORDER BY position"
+
+
+def get_items(list_id: int) -> List[ItemRecord]:
+    cur = get_conn().cursor()
+    cur.row_factory = _item_record
+    return cur.execute(_ITEMS_SQL, (list_id,)).fetchall()
+
+
+def iter_items(list_id: int, batch: int = FETCH_BATCH) -> Iterator[ItemRecord]:
+    """Как get_items, но отдаёт пункты по мере чтения (fetchmany), не держа весь список в памяти."""
+    cur = get_conn().cursor()
+    cur.row_factory = _item_record
+    return _stream(cur.execute(_ITEMS_SQL, (list_id,)), batch)
+
+
+# ---------- Порядок пунктов ----------
+# items.position — дробное число: новый пункт встаёт в конец (максимум + POSITION_STEP),
+# перенесённый — в середину между соседями, так что перенос меняет ровно одну строку.
+# Когда соседние позиции сближаются до предела точности, список перенумеровывается
+# (rebalance_positions) отдельной задачей, не в момент переноса.
+POSITION_STEP = 1.0
+POSITION_MIN_GAP = 1e-9  # относительный зазор, после которого move_item просит перенумерацию
+
+
+def _crowded(lo: float, hi: float) -> bool:
+    return hi - lo < max(abs(lo), abs(hi), 1.0) * POSITION_MIN_GAP
+
+
+def _position_between(conn: sqlite3.Connection, list_id: int, item_id: int,
+                      before_id: Optional[int]) -> Tuple[Optional[float], Optional[float]]:
+    # соседи места вставки без самого переносимого пункта; поиск по idx_items_list_position
+    hi = None
+    if before_id is not None:
+        row = conn.execute("SELECT position FROM items WHERE id=? AND list_id=?", (before_id, list_id)).fetchone()
+        if row is None:
+            raise ValueError(f"Пункт {before_id} не из списка {list_id}")
+        hi = row[0]
+        row = conn.execute("SELECT MAX(position) FROM items WHERE list_id=? AND position < ? AND id != ?",
+                           (list_id, hi, item_id)).fetchone()
+    else:
+        row = conn.execute("SELECT MAX(position) FROM items WHERE list_id=? AND id != ?", (list_id, item_id)).fetchone()
+    return row[0], hi
+
+
+def move_item(item_id: int, before_id: Optional[int] = None) -> bool:
+    """
+    Переносит пункт перед пунктом before_id (None — в конец списка), обновляя одну строку.
+    Возвращает True, если позиции в этом месте сблизились и списку пора rebalance_positions.
+    """
+    with transaction() as conn:
+        row = conn.execute("SELECT list_id FROM items WHERE id=?", (item_id,)).fetchone()
+        if row is None:
+            return False
+        list_id = row[0]
+        lo, hi = _position_between(conn, list_id, item_id, before_id)
+        if lo is not None and hi is not None and not lo < (lo + hi) / 2 < hi:
+            # точность исчерпана (перенумерация не успела) — перенумеровать сейчас и повторить
+            _renumber(conn, list_id)
+            lo, hi = _position_between(conn, list_id, item_id, before_id)
+        if lo is None and hi is None:
+            pos = POSITION_STEP
+        elif hi is None:
+            pos = lo + POSITION_STEP
+        elif lo is None:
+            pos = hi - POSITION_STEP
+        else:
+            pos = (lo + hi) / 2
+        conn.execute("UPDATE items SET position=? WHERE id=?", (pos, item_id))
+        _emit(ITEMS_CHANGED, list_id, [item_id])
+    return lo is not None and hi is not None and (_crowded(lo, pos) or _crowded(pos, hi))
+
+
+def _renumber(conn: sqlite3.Connection, list_id: int) -> int:
+    ids = [r[0] for r in conn.execute("SELECT id FROM items WHERE list_id=? ORDER BY position, id", (list_id,))]
+    conn.executemany("UPDATE items SET position=? WHERE id=?", [((n + 1) * POSITION_STEP, iid) for n, iid in enumerate(ids)])
+    return len(ids)
+
+
+def rebalance_positions(list_id: int) -> int:
+    """Перенумеровывает позиции пунктов списка с шагом POSITION_STEP (порядок не меняется)."""
+    with transaction() as conn:
+        return _renumber(conn, list_id)
 
 
 def set_item_checked(item_id: int, checked: bool) -> None:
-    conn = get_conn()
-    conn.execute("UPDATE items SET checked=? WHERE id=?", (1 if checked else 0, item_id))
-    # touch parent
-    cur = conn.execute("SELECT list_id FROM items WHERE id=?", (item_id,))
-    row = cur.fetchone()
-    if row:
-        _touch_updated(row["list_id"])
-    conn.commit()
+    set_items_checked([item_id], checked)
+
+
+def set_items_checked(item_ids: Iterable[int], checked: bool) -> int:
+    """
+    Ставит/снимает галочку у набора пунктов одной транзакцией,
+    updated_at трогается один раз на каждый затронутый список.
+    Возвращает число реально изменённых пунктов.
+    """
+    ids = list(dict.fromkeys(item_ids))
+    flag = 1 if checked else 0
+    changed = 0
+    with transaction() as conn:
+        by_list: Dict[int, List[int]] = {}
+        for chunk in _chunks(ids):
+            qmarks = ",".join("?" * len(chunk))
+            cur = conn.execute(f"SELECT id, list_id FROM items WHERE id IN ({qmarks}) AND checked!=?", [*chunk, flag])
+            for r in cur.fetchall():
+                by_list.setdefault(r[1], []).append(r[0])
+            cur = conn.execute(f"UPDATE items SET checked=? WHERE id IN ({qmarks}) AND checked!=?", [flag, *chunk, flag])
+            changed += cur.rowcount
+        _touch_updated(conn, by_list)
+        for list_id, changed_ids in by_list.items():
+            _emit(ITEMS_CHANGED, list_id, changed_ids)
+    return changed
+
+
+def set_checked_states(states: Dict[int, bool]) -> int:
+    """
+    Применяет накопленные галочки {item_id: checked} одной транзакцией
+    (для отложенной записи переключений из интерфейса). Возвращает число изменённых пунктов.
+    """
+    on = [iid for iid, checked in states.items() if checked]
+    off = [iid for iid, checked in states.items() if not checked]
+    with transaction():
+        return set_items_checked(on, True) + set_items_checked(off, False)
+
+
+def delete_items(item_ids: Iterable[int]) -> int:
+    """Удаляет пункты одной транзакцией; возвращает число удалённых."""
+    ids = list(dict.fromkeys(item_ids))
+    deleted = 0
+    with transaction() as conn:
+        by_list: Dict[int, List[int]] = {}
+        for chunk in _chunks(ids):
+            qmarks = ",".join("?" * len(chunk))
+            cur = conn.execute(f"SELECT id, list_id FROM items WHERE id IN ({qmarks})", chunk)
+            for r in cur.fetchall():
+                by_list.setdefault(r[1], []).append(r[0])
+            deleted += conn.execute(f"DELETE FROM items WHERE id IN ({qmarks})", chunk).rowcount
+        _touch_updated(conn, by_list)
+        for list_id, gone_ids in by_list.items():
+            _emit(ITEMS_DELETED, list_id, gone_ids)
+    return deleted
 
 
 def uncheck_checked_items(list_id: int) -> None:
-    conn = get_conn()
-    conn.execute("UPDATE items SET checked=0 WHERE list_id=? AND checked=1", (list_id,))
-    _touch_updated(list_id)
+    with transaction() as conn:
+        cur = conn.execute("SELECT id FROM items WHERE list_id=? AND checked=1", (list_id,))
+        ids = [r[0] for r in cur.fetchall()]
+        conn.execute("UPDATE items SET checked=0 WHERE list_id=? AND checked=1", (list_id,))
+        _touch_updated(conn, [list_id])
+        if ids:
+            _emit(ITEMS_CHANGED, list_id, ids)
 
 
 def set_pinned(list_id: int, pinned: bool) -> None:
-    conn = get_conn()
-    conn.execute("UPDATE lists SET pinned=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (1 if pinned else 0, list_id))
-    conn.commit()
+    with transaction() as conn:
+        conn.execute("UPDATE lists SET pinned=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (1 if pinned else 0, list_id))
+        _emit(LIST_CHANGED, list_id)
 
 
 def set_archived(list_id: int, archived: bool) -> None:
-    conn = get_conn()
-    conn.execute("UPDATE lists SET archived=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (1 if archived else 0, list_id))
-    conn.commit()
+    with transaction() as conn:
+        conn.execute("UPDATE lists SET archived=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (1 if archived else 0, list_id))
+        _emit(LIST_CHANGED, list_id)
 
 
 def soft_delete(list_id: int) -> None:
-    conn = get_conn()
-    conn.execute("UPDATE lists SET deleted_at=CURRENT_TIMESTAMP WHERE id=?", (list_id,))
-    conn.commit()
+    with transaction() as conn:
+        conn.execute("UPDATE lists SET deleted_at=CURRENT_TIMESTAMP WHERE id=?", (list_id,))
+        _emit(LIST_DELETED, list_id)
 
 
-def get_lists(include_archived: bool = False,
-              include_deleted: bool = False,
-              query: Optional[str] = None) -> List[Dict]:
+# ---------- Повторяющиеся чеклисты ----------
+# У повторяющегося списка есть правило (recurrence) и момент следующего сброса
+# галочек (next_reset_at, UTC). Сброс наступает в начале местных суток:
+# daily — каждый день, weekdays — в начале каждого будня, weekly — по понедельникам.
+# reset_due_lists сбрасывает все «созревшие» списки разом, набором, а не по одному.
+RECURRENCE_RULES = ("daily", "weekdays", "weekly")
+
+
+def _check_rule(rule: Optional[str]) -> None:
+    if rule is not None and rule not in RECURRENCE_RULES:
+        raise ValueError(f"Неизвестное правило повтора: {rule!r} (ожидается одно из {RECURRENCE_RULES} или None)")
+
+
+def _next_reset_sql(rule: str, now: str = "CURRENT_TIMESTAMP") -> str:
     """
-    Возвращает списки с агрегированными счётчиками.
-    Если передан query, ищем без учёта регистра по:
-      - названию списка (lists.title),
-      - пунктам чеклиста (items.text),
-      - текстовым заметкам (lists.note_text).
+    SQL-выражение момента следующего сброса после now (UTC) для правила rule;
+    NULL, если правила нет. rule и now — фрагменты SQL (столбец, ?, :now).
+    """
+    tomorrow = f"{now}, 'localtime', 'start of day', '+1 day'"
+    return f"""CASE {rule}
+        WHEN 'daily' THEN datetime({tomorrow}, 'utc')
+        WHEN 'weekdays' THEN datetime({tomorrow}, CASE strftime('%w', {tomorrow})
+            WHEN '6' THEN '+2 days' WHEN '0' THEN '+1 day' ELSE '+0 days' END, 'utc')
+        WHEN 'weekly' THEN datetime({tomorrow}, 'weekday 1', 'utc')
+    END"""
+
+
+def set_recurrence(list_id: int, rule: Optional[str]) -> None:
+    """Задаёт правило повтора (одно из RECURRENCE_RULES) или убирает его (None)."""
+    _check_rule(rule)
+    with transaction() as conn:
+        conn.execute(f"UPDATE lists SET recurrence=?, next_reset_at={_next_reset_sql('?')}, "
+                     "updated_at=CURRENT_TIMESTAMP WHERE id=?", (rule, rule, list_id))
+        _emit(LIST_CHANGED, list_id)
+
+
+def get_next_reset() -> Optional[str]:
+    """Ближайший момент сброса среди всех повторяющихся списков (UTC) или None; MIN по индексу."""
+    row = get_conn().execute("SELECT MIN(next_reset_at) FROM lists WHERE next_reset_at IS NOT NULL").fetchone()
+    return row[0]
+
+
+def reset_due_lists(now: Optional[str] = None) -> List[int]:
+    """
+    Снимает галочки во всех списках, у которых наступил next_reset_at, и переносит
+    им next_reset_at на следующий срок — одной транзакцией, по одному UPDATE на таблицу.
+    Списки находятся по idx_lists_next_reset, т.е. время не растёт с числом списков.
+    updated_at не трогается: утренний сброс не должен перетасовывать главный экран.
+    now — текущий момент UTC ('YYYY-MM-DD HH:MM:SS'), по умолчанию CURRENT_TIMESTAMP.
+    Возвращает id сброшенных списков.
+    """
+    with transaction() as conn:
+        if now is None:
+            now = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+        due = "SELECT id FROM lists WHERE next_reset_at <= :now"
+        list_ids = [r[0] for r in conn.execute(due, {"now": now})]
+        if not list_ids:
+            return []
+        by_list: Dict[int, List[int]] = {}
+        for iid, lid in conn.execute(f"SELECT id, list_id FROM items WHERE checked=1 AND list_id IN ({due})", {"now": now}):
+            by_list.setdefault(lid, []).append(iid)
+        # сброс по расписанию — не «снято пользователем»: триггер истории его пропускает (_m_history_guard)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('history_paused', 'reset')")
+        conn.execute(f"UPDATE items SET checked=0 WHERE checked=1 AND list_id IN ({due})", {"now": now})
+        conn.execute("DELETE FROM meta WHERE key = 'history_paused'")
+        conn.execute(f"UPDATE lists SET next_reset_at={_next_reset_sql('recurrence', ':now')} "
+                     "WHERE next_reset_at <= :now", {"now": now})
+        for lid, ids in by_list.items():
+            _emit(ITEMS_CHANGED, lid, ids)
+    return list_ids
+
+
+# ---------- История отметок ----------
+# Каждое переключение галочки пишет триггер trg_items_history: событие в check_events
+# и +1 в строку daily_stats (список, местный день). Статистика читает только сводку.
+# Сброс повторяющихся списков по расписанию в историю не попадает (см. reset_due_lists).
+HISTORY_DAYS = 365  # глубина completion_stats по умолчанию
+
+
+def completion_history(list_id: int, days: int = HISTORY_DAYS) -> List[Tuple[str, int, int]]:
+    """Сводка по дням за последние days дней: (день, отмечено, снято), только дни с событиями."""
+    cur = get_conn().execute(
+        "SELECT day, checks, unchecks FROM daily_stats "
+        "WHERE list_id=? AND day > date('now', 'localtime', ?) ORDER BY day",
+        (list_id, f"-{int(days)} days"))
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def completion_stats(list_id: int, days: int = HISTORY_DAYS) -> Dict:
     """
+    Серии и регулярность по сводке: current_streak (дней подряд с отметками, до сегодня;
+    сегодняшний день ещё не закончен, поэтому серия не рвётся, пока в нём нет отметок),
+    best_streak, active_days из days, checks за период и history (как completion_history).
+    """
+    history = completion_history(list_id, days)
+    active = [datetime.date.fromisoformat(day) for day, checks, _ in history if checks]
+    today = datetime.date.fromisoformat(get_conn().execute("SELECT date('now', 'localtime')").fetchone()[0])
+    best = run = 0
+    prev = None
+    for day in active:
+        run = run + 1 if prev is not None and (day - prev).days == 1 else 1
+        best = max(best, run)
+        prev = day
+    current = run if active and (today - active[-1]).days <= 1 else 0
+    return {"current_streak": current, "best_streak": best, "active_days": len(active), "days": days,
+            "checks": sum(r[1] for r in history), "history": history}
+
+
+# Лёгкая проекция для листингов: без тел заметок (их отдаёт get_note_text).
+_LIST_COLUMNS = """
+      l.id, l.title, l.color, l.pinned, l.archived, l.kind,
+      l.created_at, l.updated_at, l.deleted_at, l.item_count, l.done_count, l.recurrence"""
+
+
+def get_note_text(list_id: int) -> Optional[str]:
+    """Текст заметки (kind='text'); читается отдельно, только при открытии заметки."""
     conn = get_conn()
+    row = conn.execute("SELECT body FROM notes WHERE list_id=?", (list_id,)).fetchone()
+    return row["body"] if row else None
+
+
+def get_note_length(list_id: int) -> int:
+    """Длина текста заметки в символах (0, если текста нет)."""
+    conn = get_conn()
+    row = conn.execute("SELECT length(body) FROM notes WHERE list_id=?", (list_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def read_note_chunk(list_id: int, start: int, size: int) -> str:
+    """Фрагмент текста заметки: size символов начиная с позиции start (с нуля)."""
+    conn = get_conn()
+    row = conn.execute("SELECT substr(body, ?, ?) FROM notes WHERE list_id=?", (start + 1, size, list_id)).fetchone()
+    return row[0] if row and row[0] is not None else ""
+
+
+def _list_cursor() -> sqlite3.Cursor:
+    cur = get_conn().cursor()
+    cur.row_factory = _list_record
+    return cur
+
+
+def get_list(list_id: int) -> Optional[ListRecord]:
+    """Один список по id (в том числе архивный/удалённый) или None."""
+    return _list_cursor().execute(f"SELECT {_LIST_COLUMNS} FROM lists l WHERE l.id=?", (list_id,)).fetchone()
+
+
+SEARCH_MIN_CHARS = 3   # с этой длины запрос ищется по индексу триграмм; короче — только по названиям
+
+
+def _case_variants(q: str) -> List[str]:
+    # встроенные сравнения SQLite складывают регистр только у ASCII, поэтому для 1–2 символов
+    # перебираем написания (не больше 4): «тв» → тв, тВ, Тв, ТВ
+    return sorted({"".join(p) for p in itertools.product(*((c.lower(), c.upper()) for c in q))})
+
+
+def _list_filters(include_archived: bool, include_deleted: bool, query: Optional[str]) -> Tuple[List[str], List]:
     where = ["1=1"]
     params: List = []
 
@@ -161,30 +1089,713 @@ def get_lists(include_archived: bool = False,
     if not include_deleted:
         where.append("l.deleted_at IS NULL")
 
-    if query:
-        qnorm = (query or "").strip().lower()
-        like = f"%{qnorm}%"
-        where.append("""
-            (
-              LOWER(l.title) LIKE ? OR
-              EXISTS (
-                SELECT 1 FROM items it
-                WHERE it.list_id = l.id AND LOWER(it.text) LIKE ?
-              ) OR
-              (l.note_text IS NOT NULL AND LOWER(l.note_text) LIKE ?)
-            )
-        """)
-        params.extend([like, like, like])
+    qnorm = (query or "").strip()
+    if len(qnorm) >= SEARCH_MIN_CHARS:
+        where.append("l.id IN (SELECT list_id FROM search_fts WHERE search_fts MATCH ?)")
+        params.append(_fts_phrase(qnorm))
+    elif qnorm:
+        # триграммный индекс короткий запрос не обслуживает: ищем только в названиях, без пунктов
+        # и текстов. Просмотр идёт по idx_lists_home в порядке главного экрана и с LIMIT
+        # страницы останавливается, набрав её, — весь индекс поиска на первую букву не читается.
+        variants = _case_variants(qnorm)
+        where.append("(" + " OR ".join(["instr(l.title, ?) > 0"] * len(variants)) + ")")
+        params.extend(variants)
+    return where, params
+
+
+# Порядок главного экрана. updated_at заполнен всегда (см. _m_home_sort_index),
+# поэтому он совпадает с прежним COALESCE(updated_at, created_at) и обслуживается
+# индексом idx_lists_home; id — окончательный разрыв равенства для курсора.
+_HOME_ORDER = "l.pinned DESC, l.updated_at DESC, l.created_at DESC, l.id DESC"
+
+
+def get_lists(include_archived: bool = False,
+              include_deleted: bool = False,
+              query: Optional[str] = None) -> List[ListRecord]:
+    """
+    Возвращает списки с агрегированными счётчиками.
+    Если передан query, ищем без учёта регистра по:
+      - названию списка (lists.title),
+      - пунктам чеклиста (items.text),
+      - текстовым заметкам (notes.body).
+    Поиск идёт через FTS5-индекс search_fts (см. _create_search_index);
+    query короче SEARCH_MIN_CHARS символов ищется только в названиях.
+    """
+    return _select_lists(include_archived, include_deleted, query).fetchall()
+
+
+def iter_lists(include_archived: bool = False,
+               include_deleted: bool = False,
+               query: Optional[str] = None,
+               batch: int = FETCH_BATCH) -> Iterator[ListRecord]:
+    """
+    Как get_lists, но построчно из курсора пачками по batch (fetchmany).
+    Генератор нужно дочитать (или закрыть) в том же потоке.
+    """
+    return _stream(_select_lists(include_archived, include_deleted, query), batch)
+
+
+def _select_lists(include_archived: bool, include_deleted: bool, query: Optional[str]) -> sqlite3.Cursor:
+    where, params = _list_filters(include_archived, include_deleted, query)
+    sql = f"""
+    SELECT {_LIST_COLUMNS}
+    FROM lists l
+    WHERE {' AND '.join(where)}
+    ORDER BY {_HOME_ORDER}
+    """
+    return _list_cursor().execute(sql, params)
+
+
+def _encode_cursor(row: ListRecord) -> str:
+    key = [row["pinned"], row["updated_at"], row["created_at"], row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> List:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Некорректный курсор страницы") from e
+    if not isinstance(key, list) or len(key) != 4:
+        raise ValueError("Некорректный курсор страницы")
+    return key
 
+
+def get_lists_page(cursor: Optional[str] = None,
+                   limit: int = 100,
+                   filters: Optional[Dict] = None) -> Tuple[List[ListRecord], Optional[str]]:
+    """
+    Страница списков в порядке главного экрана (keyset-пагинация).
+    cursor — непрозрачная строка из предыдущего вызова (None — первая страница),
+    filters — include_archived / include_deleted / query, как у get_lists.
+    Возвращает (строки, курсор следующей страницы или None, если это последняя).
+    Страница N стоит столько же, сколько первая: поиск по индексу idx_lists_home
+    начинается сразу с позиции курсора.
+    """
+    filters = filters or {}
+    where, params = _list_filters(filters.get("include_archived", False),
+                                  filters.get("include_deleted", False),
+                                  filters.get("query"))
+    if cursor:
+        where.append("(l.pinned, l.updated_at, l.created_at, l.id) < (?, ?, ?, ?)")
+        params.extend(_decode_cursor(cursor))
     sql = f"""
-    SELECT
-      l.id, l.title, l.color, l.pinned, l.archived, l.kind, l.note_text,
-      l.created_at, l.updated_at,
-      (SELECT COUNT(*) FROM items i WHERE i.list_id=l.id) AS item_count,
-      (SELECT COUNT(*) FROM items i WHERE i.list_id=l.id AND i.checked=1) AS done_count
+    SELECT {_LIST_COLUMNS}
     FROM lists l
     WHERE {' AND '.join(where)}
-    ORDER BY l.pinned DESC, COALESCE(l.updated_at, l.created_at) DESC, l.created_at DESC
+    ORDER BY {_HOME_ORDER}
+    LIMIT ?
+    """
+    rows = _list_cursor().execute(sql, [*params, limit + 1]).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _encode_cursor(rows[-1])
+    return rows, None
+
+
+# ---------- Кэш результатов поиска ----------
+SEARCH_CACHE_SIZE = 32               # запросов в LRU
+SEARCH_CACHE_MAX_CHARS = 4_000_000   # символов текста документов на запрос, больше — без уточнения в памяти
+
+
+class SearchCache:
+    """
+    Кэш поиска для одного потока (и его соединения): ключ — нормализованный запрос
+    и фильтры, запись — совпавшие документы индекса (list_id, текст в casefold)
+    и строки списков в порядке главного экрана.
+
+    Если новый запрос содержит закэшированный («мол» → «моло» → «молок»), его
+    совпадения — подмножество прежних, и ответ получается фильтрацией текстов
+    в памяти, без SQLite. Любая запись сбрасывает кэш: записи других соединений
+    видны по PRAGMA data_version, записи этого процесса — по событию шины изменений.
+    """
+
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, max_chars: int = SEARCH_CACHE_MAX_CHARS):
+        self._size = size
+        self._max_chars = max_chars
+        self._entries: "OrderedDict[Tuple, Tuple[Optional[List[Tuple[int, str]]], List[ListRecord]]]" = OrderedDict()
+        self._data_version: Optional[int] = None
+        self._generation = 0          # растёт на каждый коммит в процессе (из потока писателя)
+        self._seen_generation = 0
+        self._stats = {"hits": 0, "refined": 0, "misses": 0, "invalidations": 0}
+        subscribe(self._on_change)
+
+    def _on_change(self, _events: List[ChangeEvent]) -> None:
+        self._generation += 1
+
+    def close(self) -> None:
+        unsubscribe(self._on_change)
+        self._entries.clear()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _validate(self) -> None:
+        version = get_conn().execute("PRAGMA data_version").fetchone()[0]
+        generation = self._generation
+        if version != self._data_version or generation != self._seen_generation:
+            if self._entries:
+                self._stats["invalidations"] += 1
+                self._entries.clear()
+            self._data_version, self._seen_generation = version, generation
+
+    def search(self, query: str, limit: int = 100, cursor: Optional[str] = None,
+               include_archived: bool = False, include_deleted: bool = False
+               ) -> Tuple[List[ListRecord], Optional[str]]:
+        """То же, что get_lists_page с filters={'query': query, ...}, но через кэш."""
+        qnorm = (query or "").strip()
+        if len(qnorm) < SEARCH_MIN_CHARS:
+            # пустой или короткий запрос (только по названиям, страница с LIMIT) — без кэша:
+            # его совпадения не надмножество совпадений более длинного запроса по индексу
+            return get_lists_page(cursor, limit, {"query": qnorm, "include_archived": include_archived,
+                                                  "include_deleted": include_deleted})
+        self._validate()
+        key = (qnorm.casefold(), include_archived, include_deleted)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._stats["hits"] += 1
+            self._entries.move_to_end(key)
+        else:
+            entry = self._refine(key) or self._load(key, qnorm)
+            self._entries[key] = entry
+            if len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return self._page(entry[1], cursor, limit)
+
+    def _refine(self, key: Tuple):
+        # самый длинный закэшированный запрос, который содержится в новом
+        needle, flags = key[0], key[1:]
+        base = max((k for k, e in self._entries.items() if k[1:] == flags and k[0] in needle and e[0] is not None),
+                   key=lambda k: len(k[0]), default=None)
+        if base is None:
+            return None
+        self._stats["refined"] += 1
+        self._entries.move_to_end(base)
+        docs, rows = self._entries[base]
+        docs = [(lid, body) for lid, body in docs if needle in body]
+        ids = {lid for lid, _ in docs}
+        return docs, [r for r in rows if r.id in ids]
+
+    def _load(self, key: Tuple, qnorm: str):
+        self._stats["misses"] += 1
+        cur = get_conn().execute("SELECT list_id, body FROM search_fts WHERE search_fts MATCH ?",
+                                 (_fts_phrase(qnorm),))
+        docs: Optional[List[Tuple[int, str]]] = []
+        chars = 0
+        ids = set()
+        for lid, body in cur:
+            ids.add(lid)
+            if docs is None:
+                continue
+            chars += len(body)
+            if chars > self._max_chars:
+                docs = None  # слишком много текста — запоминаем только результат, без уточнения в памяти
+            else:
+                docs.append((lid, body.casefold()))
+        rows: List[ListRecord] = []
+        where, params = _list_filters(key[1], key[2], None)
+        for chunk in _chunks(sorted(ids)):
+            rows += _list_cursor().execute(
+                f"SELECT {_LIST_COLUMNS} FROM lists l WHERE {' AND '.join(where)} "
+                f"AND l.id IN ({','.join('?' * len(chunk))})", [*params, *chunk]).fetchall()
+        rows.sort(key=lambda r: (r.pinned, r.updated_at, r.created_at, r.id), reverse=True)  # _HOME_ORDER
+        return docs, rows
+
+    @staticmethod
+    def _page(rows: List[ListRecord], cursor: Optional[str], limit: int) -> Tuple[List[ListRecord], Optional[str]]:
+        start = 0
+        if cursor:
+            after = tuple(_decode_cursor(cursor))
+            while start < len(rows) and (rows[start].pinned, rows[start].updated_at,
+                                         rows[start].created_at, rows[start].id) >= after:
+                start += 1
+        page = rows[start:start + limit]
+        more = start + limit < len(rows)
+        return page, (_encode_cursor(page[-1]) if more else None)
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики: hits (тот же запрос), refined (уточнение в памяти), misses (SQLite), invalidations."""
+        return {**self._stats, "entries": len(self._entries)}
+
+
+# ---------- Служебные отметки ----------
+def get_meta(key: str, default: Optional[str] = None) -> Optional[str]:
+    row = get_conn().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(key: str, value: Optional[str]) -> None:
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+# ---------- Восстановление из резервной копии (снимает backup.py) ----------
+def restore_from(path: str) -> None:
+    """
+    Заменяет содержимое текущей базы файлом path (backup API в соединение этого
+    потока; соединения других потоков увидят новые данные со следующего чтения)
+    и доводит схему копии до SCHEMA_VERSION. Подписчики получают DATABASE_REPLACED.
+    Проверка копии и страховочная копия текущей базы — backup.restore_backup.
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        raise RuntimeError("restore_from внутри транзакции")
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        src.backup(conn)
+    finally:
+        src.close()
+    init_db(conn)
+    with transaction():
+        _emit(DATABASE_REPLACED, 0)
+
+
+# ---------- Экспорт и пакетный импорт ----------
+# Форматы файлов и чтение/запись — в exchange.py; здесь только SQL.
+_EXPORT_LIST_COLUMNS = "id, title, color, pinned, archived, kind, created_at, updated_at, deleted_at, recurrence"
+
+
+def iter_export_lists(batch: int = FETCH_BATCH) -> Iterator[sqlite3.Row]:
+    """Все списки (включая архив и корзину) по возрастанию id, потоком из курсора."""
+    cur = get_conn().execute(f"SELECT {_EXPORT_LIST_COLUMNS} FROM lists ORDER BY id")
+    return _stream(cur, batch)
+
+
+def iter_export_notes(batch: int = FETCH_BATCH) -> Iterator[sqlite3.Row]:
+    return _stream(get_conn().execute("SELECT list_id, body FROM notes ORDER BY list_id"), batch)
+
+
+def iter_export_items(batch: int = FETCH_BATCH) -> Iterator[sqlite3.Row]:
+    return _stream(get_conn().execute("SELECT list_id, text, checked FROM items ORDER BY list_id, position"), batch)
+
+
+# триггеры, которые при массовой вставке пунктов заменяются одним set-based проходом
+BULK_TRIGGER_THRESHOLD = 1000  # с какого размера пачки выгоднее отключить построчные триггеры
+
+
+def _bulk_insert_items(conn: sqlite3.Connection, rows: List[Tuple[int, str, int, float]]) -> None:
+    """
+    executemany пунктов без построчных триггеров FTS и счётчиков: индекс поиска
+    дописывается одним INSERT ... SELECT, счётчики — одним UPDATE на список.
+    Триггеры не удаляются, а пропускают строки по ключу bulk_items в meta (_m_bulk_insert_guard):
+    схема не меняется, а ключ, убранный в той же транзакции, другие соединения не видят.
+    Вызывать внутри transaction().
+    """
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bulk_items', '1')")
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+    conn.executemany("INSERT INTO items (list_id, text, checked, position) VALUES (?, ?, ?, ?)", rows)
+    conn.execute("INSERT INTO search_fts(rowid, body, list_id) SELECT id, text, list_id FROM items WHERE id > ?", (last_id,))
+    per_list: Dict[int, List[int]] = {}
+    for list_id, _text, checked, _position in rows:
+        cnt = per_list.setdefault(list_id, [0, 0])
+        cnt[0] += 1; cnt[1] += 1 if checked else 0
+    conn.executemany("UPDATE lists SET item_count = item_count + ?, done_count = done_count + ? WHERE id = ?",
+                     [(n, done, lid) for lid, (n, done) in per_list.items()])
+    conn.execute("DELETE FROM meta WHERE key = 'bulk_items'")
+
+
+def import_state(job: str) -> Tuple[Optional[Dict], Dict[int, int]]:
+    """Контрольная точка прерванного импорта job и соответствие id (старый -> новый)."""
+    raw = get_meta(f"import:{job}")
+    if raw is None:
+        return None, {}
+    cur = get_conn().execute("SELECT old_id, new_id FROM import_ids WHERE job=?", (job,))
+    return json.loads(raw), dict(cur.fetchall())
+
+
+def _import_rule(rec: Dict) -> Optional[str]:
+    rule = rec.get("recurrence")
+    return rule if rule in RECURRENCE_RULES else None  # неизвестное правило — просто без повтора
+
+
+def import_chunk(job: str,
+                 id_map: Dict[int, int],
+                 lists: List[Dict],
+                 notes: List[Tuple[int, str]],
+                 items: List[Tuple[int, str, int]],
+                 offset: int,
+                 counts: Dict[str, int]) -> Dict[str, int]:
+    """
+    Одна пачка импорта одной транзакцией: списки (с id из файла), тексты заметок
+    и пункты (со ссылкой на id списка из файла) вставляются через executemany,
+    а вместе с ними сохраняются соответствие id и контрольная точка (offset — конец
+    пачки в файле, counts — итоги с учётом пачки): после сбоя импорт продолжится
+    ровно с конца последней закоммиченной пачки. id_map дополняется новыми списками,
+    записи со ссылкой на неизвестный список пропускаются. Возвращает счётчики пачки.
+    """
+    with transaction() as conn:
+        if lists:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM lists").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO lists (title, color, pinned, archived, kind, created_at, updated_at, deleted_at, "
+                "recurrence, next_reset_at) "
+                "VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP), ?, "
+                f"?, {_next_reset_sql('?')})",
+                [(l.get("title") or "", l.get("color") or "#ffffff", int(bool(l.get("pinned"))), int(bool(l.get("archived"))),
+                  l.get("kind") or "checklist", l.get("created_at"), l.get("updated_at"), l.get("deleted_at"),
+                  _import_rule(l), _import_rule(l))
+                 for l in lists])
+            # AUTOINCREMENT и единственный писатель: новые id идут подряд в порядке вставки
+            new_ids = [r[0] for r in conn.execute("SELECT id FROM lists WHERE id > ? ORDER BY id", (last_id,))]
+            pairs = [(l["id"], nid) for l, nid in zip(lists, new_ids) if l.get("id") is not None]
+            id_map.update(pairs)
+            conn.executemany("INSERT OR REPLACE INTO import_ids (job, old_id, new_id) VALUES (?, ?, ?)",
+                             [(job, old, new) for old, new in pairs])
+            for nid in new_ids:
+                _emit(LIST_CREATED, nid)
+        note_rows = [(id_map[old], body) for old, body in notes if old in id_map]
+        conn.executemany("INSERT OR REPLACE INTO notes (list_id, body) VALUES (?, ?)", note_rows)
+        item_rows = _with_positions(conn, [(id_map[old], text, 1 if checked else 0)
+                                           for old, text, checked in items if old in id_map])
+        if len(item_rows) >= BULK_TRIGGER_THRESHOLD:
+            _bulk_insert_items(conn, item_rows)
+        else:
+            conn.executemany("INSERT INTO items (list_id, text, checked, position) VALUES (?, ?, ?, ?)", item_rows)
+        for lid in {r[0] for r in item_rows}:
+            _emit(ITEMS_ADDED, lid)
+        added = {"lists": len(lists), "notes": len(note_rows), "items": len(item_rows),
+                 "skipped": len(notes) - len(note_rows) + len(items) - len(item_rows)}
+        total = {k: counts.get(k, 0) + v for k, v in added.items()}
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                     (f"import:{job}", json.dumps({"offset": offset, "counts": total})))
+    return added
+
+
+def finish_import(job: str) -> None:
+    """Импорт завершён: контрольная точка и таблица соответствий больше не нужны."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM meta WHERE key=?", (f"import:{job}",))
+        conn.execute("DELETE FROM import_ids WHERE job=?", (job,))
+
+
+# ---------- Очистка корзины и обслуживание файла ----------
+# Шаги короткие и независимые, чтобы фоновый планировщик (MaintenanceScheduler)
+# мог выполнять их по одному в простое и прерываться, когда пользователь вернулся.
+TRASH_RETENTION_DAYS = 30   # сколько хранить удалённые списки
+PURGE_BATCH = 50            # списков за одну транзакцию
+VACUUM_STEP_PAGES = 2000    # страниц за один incremental_vacuum
+HISTORY_RETENTION_DAYS = 90  # сколько хранить сырые события галочек (сводка по дням — всегда)
+COMPACT_BATCH = 5000         # событий за одну транзакцию compact_history
+
+
+def purge_deleted(older_than_days: int = TRASH_RETENTION_DAYS, batch_size: int = PURGE_BATCH) -> int:
+    """
+    Окончательно удаляет одну пачку списков, лежащих в корзине дольше older_than_days,
+    вместе с пунктами и текстами. Возвращает число удалённых списков (0 — чистить нечего).
+    """
+    with transaction() as conn:
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM lists WHERE deleted_at IS NOT NULL AND deleted_at < datetime('now', ?) "
+            "ORDER BY deleted_at LIMIT ?", (f"-{int(older_than_days)} days", batch_size))]
+        if not ids:
+            return 0
+        qmarks = ",".join("?" * len(ids))
+        conn.execute(f"DELETE FROM items WHERE list_id IN ({qmarks})", ids)
+        conn.execute(f"DELETE FROM notes WHERE list_id IN ({qmarks})", ids)
+        conn.execute(f"DELETE FROM daily_stats WHERE list_id IN ({qmarks})", ids)
+        conn.execute(f"DELETE FROM lists WHERE id IN ({qmarks})", ids)
+    # сырые события удалённых списков не трогаем: индекса по list_id у check_events нет,
+    # а по сроку их уберёт compact_history
+    return len(ids)
+
+
+def compact_history(keep_days: int = HISTORY_RETENTION_DAYS, batch_size: int = COMPACT_BATCH) -> int:
+    """
+    Удаляет одну пачку сырых событий галочек старше keep_days (сводка daily_stats остаётся).
+    События идут по возрастанию id вместе со временем, поэтому берутся самые старые
+    по первичному ключу, без отдельного индекса по времени. Возвращает число удалённых (0 — всё).
+    """
+    cutoff = int(time.time()) - int(keep_days) * 86400
+    with transaction() as conn:
+        last = conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM check_events WHERE at < ? ORDER BY id LIMIT ?)",
+            (cutoff, batch_size)).fetchone()[0]
+        if last is None:
+            return 0
+        return conn.execute("DELETE FROM check_events WHERE id <= ?", (last,)).rowcount
+
+
+def storage_info() -> Dict[str, int]:
+    """Размер базы в страницах: page_size, page_count, freelist_count, auto_vacuum (0/1/2), bytes."""
+    conn = get_conn()
+    info = {p: conn.execute(f"PRAGMA {p}").fetchone()[0]
+            for p in ("page_size", "page_count", "freelist_count", "auto_vacuum")}
+    info["bytes"] = info["page_size"] * info["page_count"]
+    return info
+
+
+def enable_incremental_vacuum() -> bool:
+    """
+    Переводит базу, созданную без auto_vacuum, в режим INCREMENTAL (нужен один полный VACUUM).
+    Возвращает True, если перевод был выполнен.
+    VACUUM переписывает весь файл и на время держит блокировку записи, поэтому в простое
+    его не запускают: только явно (run_maintenance из скрипта, при закрытом приложении).
+    """
+    conn = get_conn()
+    if conn.in_transaction or conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum(max_pages: int = VACUUM_STEP_PAGES) -> int:
+    """Возвращает файлу до max_pages свободных страниц; результат — сколько освобождено."""
+    conn = get_conn()
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not before or conn.in_transaction:
+        return 0
+    conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def optimize() -> None:
+    """
+    Обновляет статистику планировщика: ANALYZE при первом запуске, дальше PRAGMA optimize.
+    Оба ограничены analysis_limit из CONNECTION_PROFILE, так что время не растёт с размером базы.
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        return
+    if not _table_exists(conn, "sqlite_stat1"):
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+
+def run_maintenance(older_than_days: int = TRASH_RETENTION_DAYS) -> Dict[str, int]:
     """
-    cur = conn.execute(sql, params)
-    return [dict(r) for r in cur.fetchall()]
+    Всё обслуживание разом (для скриптов, при закрытом приложении): очистка корзины и старой
+    истории, перевод старой базы в auto_vacuum=INCREMENTAL, сжатие, статистика.
+    """
+    before = storage_info()
+    purged = 0
+    while True:
+        n = purge_deleted(older_than_days)
+        if not n:
+            break
+        purged += n
+    while compact_history():
+        pass
+    enable_incremental_vacuum()
+    while incremental_vacuum():
+        pass
+    optimize()
+    after = storage_info()
+    set_meta("maintenance_last_run", str(int(time.time())))
+    return {"purged": purged, "reclaimed_bytes": max(0, before["bytes"] - after["bytes"]), "bytes": after["bytes"]}
+
+
+# ---------- Трассировка и медленные запросы (по запросу) ----------
+# enable_tracing() подменяет публичные функции модуля обёртками с замером времени
+# и вешает set_trace_callback на соединения; disable_tracing() возвращает
+# оригиналы, так что в выключенном состоянии накладных расходов нет
+# (остаётся одно сравнение поколения в get_conn).
+# Включается также переменной окружения CHECKLIST_DB_TRACE=<порог мс>.
+
+_TRACE_SAMPLES = 2048   # последних замеров на функцию для перцентилей
+_SLOW_LOG_SIZE = 200
+
+# служебные функции, которые не оборачиваем
+_TRACE_EXCLUDE = {
+    "get_conn", "close_conn", "set_db_path", "get_db_path", "transaction", "subscribe", "unsubscribe",
+    "migration_report", "enable_tracing", "disable_tracing", "tracing_enabled", "stats", "reset_stats",
+    "slow_queries",
+}
+
+_trace_gen = 0                          # растёт при включении/выключении; соединения догоняют в get_conn
+_trace: Optional[Dict] = None           # состояние трассировки, None — выключена
+_last_trace: Optional[Dict] = None      # после disable_tracing() stats() отдаёт последний снимок
+_trace_lock = threading.Lock()
+_originals: Dict[str, Callable] = {}
+
+
+def _new_trace_state(slow_ms: float, log_path: Optional[str]) -> Dict:
+    return {
+        "slow_ms": slow_ms, "log_path": log_path, "since": time.time(),
+        "calls": {},                    # имя -> {"count", "total", "rows", "samples"}
+        "statements": 0, "commits": 0,
+        "slow": deque(maxlen=_SLOW_LOG_SIZE), "slow_total": 0,
+    }
+
+
+def _sync_trace(conn: sqlite3.Connection) -> None:
+    conn.set_trace_callback(_on_statement if _trace is not None else None)
+    _local.trace_gen = _trace_gen
+
+
+def _on_statement(sql: str) -> None:
+    state = _trace
+    # "-- ..." — внутренние инструкции FTS5 и триггеров, считаем только свои
+    if state is None or sql.startswith("--") or getattr(_local, "explaining", False):
+        return
+    with _trace_lock:
+        state["statements"] += 1
+        if sql.lstrip()[:6].upper() == "COMMIT":
+            state["commits"] += 1
+    stmts = getattr(_local, "trace_stmts", None)
+    if stmts is not None:
+        stmts.append(sql)
+
+
+def _count_rows(result) -> int:
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        result = result[0]             # (строки, курсор) у get_lists_page
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, (_Record, dict, sqlite3.Row)):
+        return 1
+    return 0
+
+
+def _query_plan(sql: str) -> List[str]:
+    head = sql.lstrip()[:6].upper()
+    if not head.startswith(("SELECT", "WITH")):
+        return []
+    conn = get_conn()
+    _local.explaining = True
+    try:
+        return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+    except sqlite3.Error as e:
+        return [f"(план недоступен: {e})"]
+    finally:
+        _local.explaining = False
+
+
+def _record_slow(state: Dict, name: str, args, kwargs, ms: float, statements: List[str]) -> None:
+    entry = {
+        "function": name,
+        "ms": round(ms, 3),
+        "args": ", ".join([*(repr(a)[:80] for a in args), *(f"{k}={v!r}"[:80] for k, v in kwargs.items())]),
+        "statements": [{"sql": sql.strip(), "plan": _query_plan(sql)} for sql in statements[:20]],
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with _trace_lock:
+        state["slow"].append(entry)
+        state["slow_total"] += 1
+    if state["log_path"]:
+        with open(state["log_path"], "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _traced(name: str, fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        state = _trace
+        if state is None:
+            return fn(*args, **kwargs)
+        outer = getattr(_local, "trace_stmts", None) is None
+        if outer:
+            _local.trace_stmts = []
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            statements = _local.trace_stmts if outer else None
+            if outer:
+                _local.trace_stmts = None
+        with _trace_lock:
+            c = state["calls"].get(name)
+            if c is None:
+                c = state["calls"][name] = {"count": 0, "total": 0.0, "rows": 0, "samples": deque(maxlen=_TRACE_SAMPLES)}
+            c["count"] += 1; c["total"] += ms; c["rows"] += _count_rows(result)
+            c["samples"].append(ms)
+        # в журнал медленных — только внешний вызов, вложенные попадут в его список инструкций
+        if outer and ms >= state["slow_ms"]:
+            _record_slow(state, name, args, kwargs, ms, statements)
+        return result
+    return wrapper
+
+
+def enable_tracing(slow_ms: float = 50.0, log_path: Optional[str] = None) -> None:
+    """
+    Включает замеры публичных функций db: число вызовов, время, перцентили,
+    строки, коммиты. Вызовы дольше slow_ms попадают в журнал медленных запросов
+    вместе с SQL и EXPLAIN QUERY PLAN (и дописываются в log_path как JSON-строки).
+    """
+    global _trace, _trace_gen
+    g = globals()
+    with _trace_lock:
+        _trace = _new_trace_state(slow_ms, log_path)
+        if not _originals:
+            for name, fn in list(g.items()):
+                if (callable(fn) and not name.startswith("_") and name not in _TRACE_EXCLUDE
+                        and getattr(fn, "__module__", None) == __name__ and not isinstance(fn, type)):
+                    _originals[name] = fn
+                    g[name] = _traced(name, fn)
+        _trace_gen += 1
+
+
+def disable_tracing() -> None:
+    """Возвращает исходные функции; накопленная статистика остаётся доступной до reset_stats()."""
+    global _trace, _trace_gen, _last_trace
+    with _trace_lock:
+        globals().update(_originals)
+        _originals.clear()
+        _last_trace, _trace = _trace or _last_trace, None
+        _trace_gen += 1
+
+
+def tracing_enabled() -> bool:
+    return _trace is not None
+
+
+def reset_stats() -> None:
+    global _trace, _last_trace
+    with _trace_lock:
+        if _trace is not None:
+            _trace = _new_trace_state(_trace["slow_ms"], _trace["log_path"])
+        _last_trace = None
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def stats() -> Dict:
+    """
+    Снимок счётчиков трассировки: по каждой функции count/total_ms/p50/p95/p99/rows,
+    общее число SQL-инструкций и коммитов, число медленных вызовов.
+    """
+    state = _trace or _last_trace
+    if state is None:
+        return {"enabled": False, "calls": {}, "statements": 0, "commits": 0, "slow": 0}
+    with _trace_lock:
+        calls = {}
+        for name, c in state["calls"].items():
+            samples = sorted(c["samples"])
+            calls[name] = {
+                "count": c["count"],
+                "total_ms": round(c["total"], 3),
+                "p50_ms": round(_percentile(samples, 0.50), 3),
+                "p95_ms": round(_percentile(samples, 0.95), 3),
+                "p99_ms": round(_percentile(samples, 0.99), 3),
+                "rows": c["rows"],
+            }
+        return {
+            "enabled": _trace is not None,
+            "since": state["since"],
+            "slow_ms": state["slow_ms"],
+            "calls": calls,
+            "statements": state["statements"],
+            "commits": state["commits"],
+            "slow": state["slow_total"],
+        }
+
+
+def slow_queries() -> List[Dict]:
+    """Последние медленные вызовы (новые в конце): функция, время, аргументы, SQL и планы."""
+    state = _trace or _last_trace
+    if state is None:
+        return []
+    with _trace_lock:
+        return list(state["slow"])
+
+
+if os.environ.get("CHECKLIST_DB_TRACE"):
+    try:
+        enable_tracing(float(os.environ["CHECKLIST_DB_TRACE"]))
+    except ValueError:
+        enable_tracing()
@@ -0,0 +1,240 @@
+"""
+Экспорт и импорт данных в JSONL/CSV.
+
+Файл — поток записей трёх типов, сначала списки, затем тексты заметок и пункты:
+  {"type": "list", "id": 7, "title": "...", "color": "#fff7cc", "pinned": 0, "archived": 0,
+   "kind": "checklist", "created_at": "...", "updated_at": "...", "deleted_at": null, "recurrence": "daily"}
+  {"type": "note", "list_id": 7, "body": "..."}
+  {"type": "item", "list_id": 7, "text": "...", "checked": 1}
+В CSV те же поля колонками CSV_FIELDS (текст заметки — в колонке text).
+
+Экспорт идёт курсорами базы, импорт — чтением файла построчно и пачками
+по CHUNK_RECORDS записей через db.import_chunk; ни то ни другое не держит
+все данные в памяти. Прерванный импорт того же файла продолжается с последней пачки.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import db
+
+CHUNK_RECORDS = 50_000  # записей файла на одну транзакцию импорта
+CSV_FIELDS = ["type", "id", "list_id", "title", "text", "checked", "color", "pinned", "archived", "kind",
+              "created_at", "updated_at", "deleted_at", "recurrence"]
+_INT_FIELDS = ("id", "list_id", "checked", "pinned", "archived")
+_TEXT_FIELDS = ("title", "text")  # пустая строка — значение, а не отсутствие поля
+
+# progress(обработано байт, всего байт, счётчики)
+ProgressCallback = Callable[[int, int, Dict[str, int]], None]
+
+
+class ImportCancelled(Exception):
+    """Импорт остановлен по запросу; продолжится с контрольной точки при повторном запуске."""
+
+
+def _file_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"Неизвестный формат файла: {path} (ожидается .jsonl или .csv)")
+
+
+# ---------- Экспорт ----------
+def _export_records() -> Iterator[Dict]:
+    for r in db.iter_export_lists():
+        yield {"type": "list", **dict(r)}
+    for r in db.iter_export_notes():
+        yield {"type": "note", "list_id": r["list_id"], "body": r["body"]}
+    for r in db.iter_export_items():
+        yield {"type": "item", "list_id": r["list_id"], "text": r["text"], "checked": r["checked"]}
+
+
+def export_file(path: str, progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+    """
+    Выгружает все списки, заметки и пункты в path (.jsonl или .csv).
+    Пишет во временный файл и переименовывает в конце; при ошибке (диск, progress) временный
+    файл удаляется, так что недописанного файла не остаётся.
+    Все три прохода (списки, заметки, пункты) читают один снимок базы в одной
+    читающей транзакции: запись, закоммиченная посреди экспорта, в файл не попадёт
+    наполовину (например, пункты без своего списка).
+    """
+    fmt = _file_format(path)
+    counts = {"list": 0, "note": 0, "item": 0}
+    tmp = path + ".part"
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as f, db.transaction():
+            if fmt == "csv":
+                writer = csv.DictWriter(f, CSV_FIELDS, extrasaction="ignore")
+                writer.writeheader()
+            for n, rec in enumerate(_export_records(), 1):
+                if fmt == "csv":
+                    if rec["type"] == "note":
+                        rec = {"type": "note", "list_id": rec["list_id"], "text": rec["body"]}
+                    writer.writerow(rec)
+                else:
+                    f.write(json.dumps(rec, ensure_ascii=False))
+                    f.write("\n")
+                counts[rec["type"]] += 1
+                if progress and n % CHUNK_RECORDS == 0:
+                    progress(dict(counts))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return counts
+
+
+# ---------- Импорт ----------
+def _read_jsonl(f) -> Iterator[Tuple[Dict, int]]:
+    decode = json.JSONDecoder().decode  # json.loads на bytes каждый раз угадывает кодировку
+    pos = f.tell()
+    for line in f:
+        pos += len(line)
+        if line.strip():
+            yield decode(line.decode("utf-8")), pos
+
+
+def _read_csv(f) -> Iterator[Tuple[Dict, int]]:
+    # csv.reader забирает строки по одной, так что после каждой записи
+    # pos — точный конец записи в байтах (даже с переводами строк внутри кавычек)
+    pos = f.tell()
+    header = None
+
+    def lines():
+        nonlocal pos
+        for raw in f:
+            pos += len(raw)
+            yield raw.decode("utf-8-sig")
+
+    for row in csv.reader(lines()):
+        if header is None:
+            header = row; continue
+        rec: Dict = {}
+        for key, value in zip(header, row):
+            if value == "" and key not in _TEXT_FIELDS:
+                continue
+            rec[key] = int(value) if key in _INT_FIELDS else value
+        if rec.get("type") == "note":
+            rec["body"] = rec.pop("text", "")
+        yield rec, pos
+
+
+def _job_id(path: str) -> str:
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class ImportJob:
+    """
+    Импорт файла пачками: step() читает следующие CHUNK_RECORDS записей и
+    коммитит их одной транзакцией (вместе с контрольной точкой). Так импорт
+    можно выполнять по шагу за задачу писателя и прерывать между шагами.
+    """
+
+    def __init__(self, path: str, chunk_records: int = CHUNK_RECORDS,
+                 progress: Optional[ProgressCallback] = None):
+        self.path = path
+        self.format = _file_format(path)
+        self.chunk_records = chunk_records
+        self.progress = progress
+        self.job = _job_id(path)
+        self.total_bytes = os.path.getsize(path)
+        state, self._id_map = db.import_state(self.job)
+        state = state or {}
+        self.offset: int = state.get("offset", 0)
+        self.counts: Dict[str, int] = state.get("counts", {"lists": 0, "notes": 0, "items": 0, "skipped": 0})
+        self.resumed = bool(state)
+        self.done = False
+        self.started = time.perf_counter()
+        self._file = open(path, "rb")
+        # CSV: заголовок нужен и при продолжении с середины
+        self._header = self._file.readline() if self.format == "csv" and self.offset else b""
+        self._file.seek(self.offset)
+        self._records = self._reader()
+
+    def _reader(self) -> Iterator[Tuple[Dict, int]]:
+        if self.format == "jsonl":
+            return _read_jsonl(self._file)
+        if self._header:
+            # подставляем заголовок перед продолжением; позиция считается от offset
+            head, base = self._header, self.offset
+            def with_header():
+                for rec, pos in _read_csv(_Prepend(head, self._file)):
+                    yield rec, base + pos - len(head)
+            return with_header()
+        return _read_csv(self._file)
+
+    def step(self) -> bool:
+        """Одна пачка; False, когда файл дочитан."""
+        if self.done:
+            return False
+        lists: List[Dict] = []
+        notes: List[Tuple[int, str]] = []
+        items: List[Tuple[int, str, int]] = []
+        end = self.offset
+        for n, (rec, pos) in enumerate(self._records, 1):
+            kind = rec.get("type")
+            if kind == "list":
+                lists.append(rec)
+            elif kind == "note":
+                notes.append((rec.get("list_id"), rec.get("body") or ""))
+            elif kind == "item":
+                items.append((rec.get("list_id"), rec.get("text") or "", rec.get("checked") or 0))
+            end = pos
+            if n >= self.chunk_records:
+                break
+        else:
+            self.done = True
+        if end != self.offset:
+            added = db.import_chunk(self.job, self._id_map, lists, notes, items, end, self.counts)
+            for key, value in added.items():
+                self.counts[key] += value
+            self.offset = end
+        if self.done:
+            db.finish_import(self.job)
+            self._file.close()
+        if self.progress:
+            self.progress(self.offset, self.total_bytes, dict(self.counts))
+        return not self.done
+
+    def run(self, cancelled: Callable[[], bool] = lambda: False) -> Dict[str, int]:
+        """Весь файл за один вызов; cancelled() проверяется между пачками."""
+        while self.step():
+            if cancelled():
+                self.close()
+                raise ImportCancelled(self.path)
+        return self.report()
+
+    def report(self) -> Dict[str, int]:
+        return {**self.counts, "seconds": round(time.perf_counter() - self.started, 2), "resumed": self.resumed}
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class _Prepend:
+    """Итератор строк файла с заданной первой строкой (заголовок CSV при продолжении)."""
+
+    def __init__(self, first: bytes, f):
+        self._first, self._f = first, f
+
+    def tell(self) -> int:
+        return 0
+
+    def __iter__(self):
+        yield self._first
+        yield from self._f
+
+
+def import_file(path: str, progress: Optional[ProgressCallback] = None,
+                chunk_records: int = CHUNK_RECORDS) -> Dict[str, int]:
+    """Импортирует файл целиком (продолжая прерванный импорт того же файла)."""
+    return ImportJob(path, chunk_records, progress).run()
@@ -1,15 +1,29 @@
+import sqlite3
 import sys
 from typing import Dict, Set
 
-from PySide6.QtCore import Qt, Signal, QRectF
-from PySide6.QtGui import QFont, QAction, QPixmap, QIcon, QColor, QBrush, QPainter, QLinearGradient, QPainterPath
+from PySide6.QtCore import (
+    Qt, Signal, Slot, QRect, QRectF, QSize, QEvent, QObject, QThread, QTimer, QMetaObject, QDate,
+    QAbstractTableModel, QAbstractListModel, QModelIndex, QMimeData
+)
+from PySide6.QtGui import (
+    QFont, QFontMetrics, QTextCursor, QAction, QPixmap, QIcon, QColor, QBrush, QPen, QPainter, QLinearGradient, QPainterPath,
+    QShortcut, QKeySequence, QDrag
+)
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton,
-    QDialog, QDialogButtonBox, QLineEdit, QTextEdit, QScrollArea, QCheckBox, QFrame,
-    QInputDialog, QMessageBox, QToolBar, QComboBox, QTreeWidget, QTreeWidgetItem, QStyleFactory
+    QApplication, QWidget, QVBoxLayout, QLabel, QPushButton,
+    QDialog, QDialogButtonBox, QLineEdit, QTextEdit, QPlainTextEdit, QListView, QAbstractItemView, QStyledItemDelegate,
+    QInputDialog, QMessageBox, QToolBar, QComboBox, QTreeView, QStyleFactory,
+    QMenu, QToolButton, QFileDialog, QProgressDialog
 )
 
+import backup
 import db
+import exchange
+from data_service import data_service, toggle_buffer, maintenance_scheduler, recurrence_scheduler
+
+# подписи правил повтора (db.RECURRENCE_RULES); None — обычный список
+RECURRENCE_LABELS = {None: "Не повторять", "daily": "Каждый день", "weekdays": "По будням", "weekly": "По понедельникам"}
 
 
 # ---------- Вспомогательное: иконка приложения ----------
@@ -40,7 +54,6 @@ def make_app_icon(size: int = 256) -> QIcon:
     path.lineTo(size * 0.45, size * 0.74)
     path.lineTo(size * 0.78, size * 0.36)
 
-    from PySide6.QtGui import QPen
     pen = QPen(QColor("#ffffff"), max(6, int(size * 0.08)), Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
     p.setPen(pen)
     p.setBrush(Qt.NoBrush)
@@ -81,6 +94,12 @@ class NewListDialog(QDialog):
         self.type_combo = QComboBox()
         self.type_combo.addItems(["Список (чекбоксы)", "Заметка (текст)"])
 
+        self.repeat_lbl = QLabel("Снимать галочки")
+        self.repeat_combo = QComboBox()
+        for rule, label in RECURRENCE_LABELS.items():
+            self.repeat_combo.addItem(label, rule)
+        self.type_combo.currentIndexChanged.connect(self._on_type_changed)
+
         color_lbl = QLabel("Цвет карточки")
         self.color_combo = QComboBox()
         self._populate_color_combo()
@@ -96,12 +115,17 @@ class NewListDialog(QDialog):
         lay = QVBoxLayout(self)
         lay.addWidget(name_lbl); lay.addWidget(self.title_edit)
         lay.addWidget(type_lbl); lay.addWidget(self.type_combo)
+        lay.addWidget(self.repeat_lbl); lay.addWidget(self.repeat_combo)
         lay.addWidget(color_lbl); lay.addWidget(self.color_combo)
         lay.addWidget(items_lbl); lay.addWidget(self.items_edit)
         lay.addWidget(btns)
 
         self._apply_dialog_styles()
 
+    def _on_type_changed(self, index: int):
+        # повтор бывает только у чеклистов
+        self.repeat_lbl.setVisible(index == 0); self.repeat_combo.setVisible(index == 0)
+
     def _populate_color_combo(self):
         for hexc in self.COLORS:
             pm = QPixmap(18, 18); pm.fill(QColor(hexc))
@@ -130,10 +154,11 @@ class NewListDialog(QDialog):
         raw_text = self.items_edit.toPlainText().strip()
         raw_lines = [s for s in raw_text.splitlines()]
         items = [s.strip() for s in raw_lines if s.strip()] if is_checklist else []
-        return title, items, color, is_checklist, raw_text
+        recurrence = self.repeat_combo.currentData() if is_checklist else None
+        return title, items, color, is_checklist, raw_text, recurrence
 
     def accept(self):
-        title, items, color, is_checklist, _raw = self.get_data()
+        title, items, color, is_checklist, _raw, _recurrence = self.get_data()
         if not title:
             QMessageBox.warning(self, "Пустое название", "Введите название.")
             return
@@ -143,62 +168,285 @@ class NewListDialog(QDialog):
         super().accept()
 
 
-# ---------- Строка пункта списка (ListWindow) ----------
-class ItemRow(QFrame):
-    toggled_for_action = Signal(int, bool)  # (item_id, selected_for_action)
+# ---------- Модель и отрисовка пунктов списка (ListWindow) ----------
+SELECTED_ROLE = Qt.UserRole + 1  # строка выделена для групповых действий (зелёная)
+ITEM_MIME = "application/x-checklist-item-row"  # перетаскивание пункта внутри списка: номер строки
+
 
-    def __init__(self, item: dict, on_done_toggle, parent=None):
+class ChecklistModel(QAbstractListModel):
+    """
+    Пункты чеклиста: текст, галочка и выделение «для действия».
+    Галочка выделяет строку, снятие галочки — снимает выделение (как раньше у ItemRow).
+    """
+    done_toggled = Signal(int, bool)  # (item_id, checked)
+    item_moved = Signal(int, object)  # (item_id, id пункта, перед которым он теперь стоит, или None — в конце)
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.setObjectName("itemRow")
-        self.item_id = item["id"]
-        self._selected = False
-        self._on_done_toggle = on_done_toggle
-
-        lay = QHBoxLayout(self); lay.setContentsMargins(10, 8, 10, 8); lay.setSpacing(10)
-        self.done_cb = QCheckBox(item["text"]); self.done_cb.setObjectName("todo")
-        self.done_cb.setChecked(bool(item["checked"]))
-        self.done_cb.stateChanged.connect(self._on_done_state_changed)
-        lay.addWidget(self.done_cb, 1)
-
-        self._apply_done_style(self.done_cb.isChecked())
-        if self.done_cb.isChecked():
-            self._selected = True
-        self._apply_selected_style()
-
-    def mousePressEvent(self, e):
-        self._selected = not self._selected
-        self._apply_selected_style()
-        self.toggled_for_action.emit(self.item_id, self._selected)
-        super().mousePressEvent(e)
-
-    def _on_done_state_changed(self, state: int):
-        done = (state == Qt.Checked)
-        self._on_done_toggle(self.item_id, done)
-        self._apply_done_style(done)
-        self._selected = done
-        self._apply_selected_style()
-        self.toggled_for_action.emit(self.item_id, self._selected)
-
-    def _apply_done_style(self, checked: bool):
-        f = self.done_cb.font(); f.setStrikeOut(checked); self.done_cb.setFont(f)
-        self.done_cb.setStyleSheet("QCheckBox#todo { color: %s; }" % ("#6b7280" if checked else "#1f2937"))
-
-    def _apply_selected_style(self):
-        self.setProperty("selected", True if self._selected else False)
-        self.style().unpolish(self); self.style().polish(self)
-
-    def set_selected(self, on: bool):
-        self._selected = on; self._apply_selected_style()
-
-    def is_selected(self) -> bool:
-        return self._selected
-
-    def set_done(self, checked: bool):
-        self.done_cb.blockSignals(True); self.done_cb.setChecked(checked); self.done_cb.blockSignals(False)
-        self._apply_done_style(checked)
+        self._items: list = []
+        self.selected: Set[int] = set()
+
+    def set_items(self, rows):
+        self.beginResetModel()
+        self._items = [{"id": r["id"], "text": r["text"], "checked": bool(r["checked"])} for r in rows]
+        self.selected.clear()
+        self.selected.update(it["id"] for it in self._items if it["checked"])
+        self.endResetModel()
+
+    def item(self, row: int) -> dict:
+        return self._items[row]
+
+    def checked_ids(self) -> list:
+        return [it["id"] for it in self._items if it["checked"]]
+
+    def append_item(self, item_id: int, text: str, checked: bool = False):
+        n = len(self._items)
+        self.beginInsertRows(QModelIndex(), n, n)
+        self._items.append({"id": item_id, "text": text, "checked": checked})
+        if checked: self.selected.add(item_id)
+        self.endInsertRows()
+
+    def remove_ids(self, ids):
+        ids = set(ids)
+        rows = [i for i, it in enumerate(self._items) if it["id"] in ids]
+        # удаляем непрерывными диапазонами с конца, чтобы индексы не съезжали
+        while rows:
+            last = first = rows.pop()
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._items[first:last + 1]
+            self.endRemoveRows()
+        self.selected.difference_update(ids)
+
+    def uncheck_all(self):
+        """Снимает галочки и выделение на месте; перерисовываются только изменённые строки."""
+        changed = [i for i, it in enumerate(self._items) if it["checked"] or it["id"] in self.selected]
+        for i in changed:
+            self._items[i]["checked"] = False
+        self.selected.clear()
+        if changed:
+            self.dataChanged.emit(self.index(changed[0]), self.index(changed[-1]))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    # --- перетаскивание: бросать можно только между строками (на корень), не на пункт ---
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [ITEM_MIME]
+
+    def mimeData(self, indexes):
+        mime = QMimeData()
+        mime.setData(ITEM_MIME, str(indexes[0].row()).encode())
+        return mime
+
+    def dropMimeData(self, data, action, row, column, parent):
+        if action != Qt.MoveAction or not data.hasFormat(ITEM_MIME):
+            return False
+        src = int(bytes(data.data(ITEM_MIME)).decode())
+        self.move_row(src, len(self._items) if row < 0 else row)
+        return True
+
+    def move_row(self, src: int, dest: int):
+        """Ставит строку src перед строкой dest (dest = rowCount — в конец) и сообщает item_moved."""
+        if dest in (src, src + 1) or not 0 <= src < len(self._items):
+            return
+        self.beginMoveRows(QModelIndex(), src, src, QModelIndex(), dest)
+        it = self._items.pop(src)
+        self._items.insert(dest - 1 if dest > src else dest, it)
+        self.endMoveRows()
+        at = self._items.index(it)
+        before = self._items[at + 1]["id"] if at + 1 < len(self._items) else None
+        self.item_moved.emit(it["id"], before)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        it = self._items[index.row()]
+        if role == Qt.DisplayRole:
+            return it["text"]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if it["checked"] else Qt.Unchecked
+        if role == SELECTED_ROLE:
+            return it["id"] in self.selected
+        if role == Qt.UserRole:
+            return it["id"]
+        return None
+
+    def toggle_done(self, row: int):
+        it = self._items[row]
+        it["checked"] = not it["checked"]
+        if it["checked"]: self.selected.add(it["id"])
+        else: self.selected.discard(it["id"])
+        idx = self.index(row); self.dataChanged.emit(idx, idx)
+        self.done_toggled.emit(it["id"], it["checked"])
+
+    def toggle_selected(self, row: int):
+        iid = self._items[row]["id"]
+        if iid in self.selected: self.selected.discard(iid)
+        else: self.selected.add(iid)
+        idx = self.index(row); self.dataChanged.emit(idx, idx, [SELECTED_ROLE])
+
+
+class ChecklistDelegate(QStyledItemDelegate):
+    """
+    Рисует строку пункта целиком (карточка, чекбокс, зачёркивание, зелёное выделение)
+    без виджетов на строку. Клик по чекбоксу/тексту ставит галочку,
+    клик по полям карточки — выделяет строку.
+    """
+    MARGIN_X, MARGIN_Y = 6, 4     # отступ карточки от края / половина промежутка между строками
+    PAD_X, PAD_Y = 10, 8          # внутренние поля карточки
+    INDICATOR, GAP, RADIUS = 22, 10, 12
+
+    CARD_BG, CARD_BORDER = QColor("#ffffff"), QColor("#e5e7eb")
+    SEL_BG, SEL_BORDER = QColor("#22c55e"), QColor("#16a34a")
+    BOX_BORDER = QColor("#94a3b8")
+    TEXT, TEXT_DONE, TEXT_SELECTED = QColor("#1f2937"), QColor("#6b7280"), QColor("#ffffff")
+
+    def _card_rect(self, rect: QRect) -> QRect:
+        return rect.adjusted(self.MARGIN_X, self.MARGIN_Y, -self.MARGIN_X, -self.MARGIN_Y)
+
+    def _content_rect(self, card: QRect) -> QRect:
+        return card.adjusted(self.PAD_X, self.PAD_Y, -self.PAD_X, -self.PAD_Y)
+
+    def sizeHint(self, option, index):
+        h = max(self.INDICATOR, option.fontMetrics.height()) + 2 * (self.PAD_Y + self.MARGIN_Y)
+        return QSize(option.rect.width(), h)
+
+    def paint(self, painter, option, index):
+        # читаем модель напрямую, минуя QVariant-конвертацию index.data() на каждую строку
+        model = index.model()
+        it = model.item(index.row())
+        checked = it["checked"]
+        selected = it["id"] in model.selected
+        card = self._card_rect(option.rect)
+        content = self._content_rect(card)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setPen(QPen(self.SEL_BORDER if selected else self.CARD_BORDER, 1))
+        painter.setBrush(self.SEL_BG if selected else self.CARD_BG)
+        painter.drawRoundedRect(QRectF(card).adjusted(0.5, 0.5, -0.5, -0.5), self.RADIUS, self.RADIUS)
+
+        box = QRectF(content.left(), content.center().y() - self.INDICATOR / 2 + 1, self.INDICATOR, self.INDICATOR)
+        painter.setPen(QPen(self.SEL_BORDER if checked else self.BOX_BORDER, 1))
+        painter.setBrush(self.SEL_BG if checked else self.CARD_BG)
+        painter.drawRoundedRect(box.adjusted(0.5, 0.5, -0.5, -0.5), 6, 6)
+        if checked:
+            tick = QPainterPath()
+            tick.moveTo(box.left() + box.width() * 0.26, box.top() + box.height() * 0.55)
+            tick.lineTo(box.left() + box.width() * 0.45, box.top() + box.height() * 0.74)
+            tick.lineTo(box.left() + box.width() * 0.78, box.top() + box.height() * 0.36)
+            painter.setPen(QPen(self.TEXT_SELECTED, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(tick)
+
+        text_rect = content.adjusted(self.INDICATOR + self.GAP, 0, 0, 0)
+        font = QFont(option.font); font.setStrikeOut(checked)
+        painter.setFont(font)
+        painter.setPen(self.TEXT_SELECTED if selected else (self.TEXT_DONE if checked else self.TEXT))
+        text = QFontMetrics(font).elidedText(it["text"], Qt.ElideRight, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick):
+            return True  # реагируем на отпускание, как QCheckBox
+        if event.type() != QEvent.MouseButtonRelease or event.button() != Qt.LeftButton:
+            return False
+        card = self._card_rect(option.rect)
+        pos = event.position().toPoint()
+        if self._content_rect(card).contains(pos):
+            model.toggle_done(index.row())
+        elif card.contains(pos):
+            model.toggle_selected(index.row())
+        return True
+
+
+# ---------- Просмотр больших текстовых заметок ----------
+LARGE_NOTE_THRESHOLD = 200_000  # символов; длиннее — просмотр кусками через LargeNoteView
+NOTE_CHUNK_CHARS = 64_000       # сколько символов подгружать за раз
+
+
+class LargeNoteView(QPlainTextEdit):
+    """
+    Просмотр многомегабайтных заметок: текст читается из базы кусками
+    (db.read_note_chunk) по мере прокрутки к концу, а QPlainTextEdit
+    раскладывает и рисует только видимые блоки.
+    """
+
+    def __init__(self, list_id: int, length: int, parent=None):
+        super().__init__(parent)
+        self.list_id = list_id
+        self.length = length
+        self.loaded = 0
+        self._loading = False  # кусок уже читается в фоне
+        self._generation = 0    # растёт в stop(); куски, прочитанные для прежнего вида, отбрасываются
+        self.setObjectName("noteViewer")
+        self.setReadOnly(True)
+        self.verticalScrollBar().valueChanged.connect(self._maybe_load_more)
+        self.load_more()
+
+    def load_more(self):
+        if self._loading or self.loaded >= self.length:
+            return
+        self._loading = True
+        gen = self._generation
+        data_service().read(db.read_note_chunk, self.list_id, self.loaded, NOTE_CHUNK_CHARS,
+                            callback=lambda chunk: self._append_chunk(gen, chunk))
+
+    def stop(self):
+        """Отменяет ожидающие куски: вызывать перед deleteLater, ответ может прийти уже после удаления."""
+        self._generation += 1
+        self.loaded = self.length
+
+    def _append_chunk(self, gen: int, chunk: str):
+        if gen != self._generation:
+            return
+        self._loading = False
+        if not chunk:
+            self.loaded = self.length; return
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
+        self.loaded += len(chunk)
+        if self.verticalScrollBar().maximum() == 0:
+            self.load_more()  # окно ещё не заполнено
+
+    def _maybe_load_more(self, value: int):
+        bar = self.verticalScrollBar()
+        if value >= bar.maximum() - bar.pageStep():
+            self.load_more()
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        # первая порция может не заполнить окно — тогда прокрутки нет и подгрузку запускаем сами
+        if self.verticalScrollBar().maximum() == 0:
+            QTimer.singleShot(0, self.load_more)
 
 
 # ---------- Окно со списком задач / текстовой заметкой ----------
+def load_list_payload(list_id: int):
+    """
+    Всё, что нужно ListWindow, одним фоновым чтением:
+    (строка списка, пункты или длина заметки, текст небольшой заметки или None).
+    """
+    current = db.get_list(list_id)
+    if current and current["kind"] == "text":
+        length = db.get_note_length(list_id)
+        text = None if length > LARGE_NOTE_THRESHOLD else (db.get_note_text(list_id) or "")
+        return current, length, text
+    return current, db.get_items(list_id), None
+
+
 class ListWindow(QWidget):
     def __init__(self, list_id: int, home: QWidget):
         super().__init__()
@@ -208,9 +456,10 @@ class ListWindow(QWidget):
         self.list_id = list_id
         self.home = home
         self._exit_on_close = True
-        self.selected_items: Set[int] = set()
-        self.rows: Dict[int, ItemRow] = {}
-        self.text_view: QTextEdit | None = None  # для текстовых заметок
+        self.model = ChecklistModel(self)
+        self.model.done_toggled.connect(toggle_buffer().set_checked)  # запись пачками, см. ToggleBuffer
+        self.selected_items: Set[int] = self.model.selected
+        self.text_view: QTextEdit | LargeNoteView | None = None  # для текстовых заметок
 
         root = QVBoxLayout(self); root.setContentsMargins(14, 14, 14, 14); root.setSpacing(10)
 
@@ -219,22 +468,78 @@ class ListWindow(QWidget):
         self.delete_action = QAction("🗑 Удалить выбранные", self); self.delete_action.triggered.connect(self._delete_selected)
         self.clear_checks_action = QAction("✔ Снять галочки", self); self.clear_checks_action.triggered.connect(self._uncheck_done)
         toolbar.addAction(self.back_action); toolbar.addSeparator(); toolbar.addAction(self.delete_action); toolbar.addAction(self.clear_checks_action)
+        repeat_menu = QMenu(self)
+        self.repeat_actions: Dict[str | None, QAction] = {}
+        for rule, label in RECURRENCE_LABELS.items():
+            act = repeat_menu.addAction(label); act.setCheckable(True)
+            act.triggered.connect(lambda _checked=False, r=rule: self._set_recurrence(r))
+            self.repeat_actions[rule] = act
+        self.repeat_btn = QToolButton(); self.repeat_btn.setText("🔁"); self.repeat_btn.setToolTip("Повтор: снимать галочки")
+        self.repeat_btn.setMenu(repeat_menu); self.repeat_btn.setPopupMode(QToolButton.InstantPopup)
+        self.repeat_widget = toolbar.addWidget(self.repeat_btn)
+        self.stats_action = QAction("📈", self); self.stats_action.setToolTip("История выполнения")
+        self.stats_action.triggered.connect(self._show_stats); toolbar.addAction(self.stats_action)
 
         self.title_lbl = QLabel(""); f = QFont(); f.setPointSize(13); f.setBold(True); self.title_lbl.setFont(f)
 
-        self.scroll = QScrollArea(); self.scroll.setWidgetResizable(True)
-        self.items_host = QWidget()
-        self.items_layout = QVBoxLayout(self.items_host); self.items_layout.setContentsMargins(6,6,6,6); self.items_layout.setSpacing(8); self.items_layout.addStretch()
-        self.scroll.setWidget(self.items_host)
+        self.empty_hint = QLabel("Пока нет пунктов. Нажмите «Добавить пункт»."); self.empty_hint.setStyleSheet("color:#6b7280;")
+        self.list_view = QListView(); self.list_view.setObjectName("checklist")
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(ChecklistDelegate(self.list_view))
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.list_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        # перетаскивание пунктов: начинаем сами (выделения у вида нет), бросок обрабатывает модель
+        self.list_view.setDragDropMode(QAbstractItemView.DropOnly)
+        self.list_view.setDragDropOverwriteMode(False)
+        self.list_view.setDropIndicatorShown(True)
+        self.list_view.viewport().installEventFilter(self)
+        self._drag_start: tuple | None = None  # (позиция нажатия, строка)
+        self.model.item_moved.connect(self._on_item_moved)
 
         self.add_btn = QPushButton("＋ Добавить пункт"); self.add_btn.clicked.connect(self._add_item)
 
-        root.addWidget(toolbar); root.addWidget(self.title_lbl); root.addWidget(self.scroll, 1); root.addWidget(self.add_btn)
+        root.addWidget(toolbar); root.addWidget(self.title_lbl); root.addWidget(self.empty_hint)
+        root.addWidget(self.list_view, 1); root.addWidget(self.add_btn)
+        self._root = root
+
+        recurrence_scheduler().lists_reset.connect(self._on_lists_reset)
 
         self._apply_styles()
         self._load_data()
 
+    def eventFilter(self, obj, event):
+        if obj is self.list_view.viewport():
+            if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+                pos = event.position().toPoint()
+                idx = self.list_view.indexAt(pos)
+                self._drag_start = (pos, idx.row()) if idx.isValid() else None
+            elif event.type() == QEvent.MouseMove and self._drag_start and event.buttons() & Qt.LeftButton:
+                pos, row = self._drag_start
+                if (event.position().toPoint() - pos).manhattanLength() >= QApplication.startDragDistance():
+                    self._drag_start = None
+                    self._start_drag(row)
+                    return True
+            elif event.type() == QEvent.MouseButtonRelease:
+                self._drag_start = None
+        return super().eventFilter(obj, event)
+
+    def _start_drag(self, row: int):
+        index = self.model.index(row)
+        drag = QDrag(self.list_view.viewport())
+        drag.setMimeData(self.model.mimeData([index]))
+        drag.setPixmap(self.list_view.viewport().grab(self.list_view.visualRect(index)))
+        drag.exec(Qt.MoveAction)
+
+    def _on_item_moved(self, item_id: int, before_id):
+        data_service().write(db.move_item, item_id, before_id, callback=self._on_move_saved)
+
+    def _on_move_saved(self, crowded: bool):
+        if crowded:  # соседние позиции сблизились — перенумеровать список фоновой записью
+            data_service().write(db.rebalance_positions, self.list_id)
+
     def closeEvent(self, event):
+        toggle_buffer().flush()
         if self._exit_on_close: QApplication.quit()
         else: event.accept()
 
@@ -246,81 +551,82 @@ class ListWindow(QWidget):
             QToolBar QToolButton { padding:8px 12px; border-radius:10px; background:#ffffff; border:1px solid #e5e7eb; margin-right:8px; }
             QPushButton { background: qlineargradient(x1:0,y1:0, x2:0, y2:1, stop:0 #4f46e5, stop:1 #4338ca);
                           border:0; color:#fff; padding:10px 14px; border-radius:14px; font-weight:600; }
-            QFrame#itemRow { background:#ffffff; border:1px solid #e5e7eb; border-radius:12px; }
-            QFrame#itemRow[selected="true"] { background:#22c55e; border:1px solid #16a34a; color:white; }
-            QFrame#itemRow[selected="true"] QCheckBox { color: white; }
-            QCheckBox#todo::indicator { width: 22px; height: 22px; margin-right: 10px; border-radius: 6px; border: 1px solid #94a3b8; background: #ffffff; }
-            QCheckBox#todo::indicator:checked { background: #22c55e; border: 1px solid #16a34a; }
-            QCheckBox#todo::indicator:unchecked { background: #ffffff; }
-            QTextEdit#noteViewer { background:#ffffff; border:1px solid #e5e7eb; border-radius:12px; padding:12px; }
+            QListView#checklist { border:0; }
+            QTextEdit#noteViewer, QPlainTextEdit#noteViewer { background:#ffffff; border:1px solid #e5e7eb; border-radius:12px; padding:12px; }
         """)
 
     def _selected_ids(self) -> Set[int]:
         if self.selected_items:
             return set(self.selected_items)
-        return {iid for iid, row in self.rows.items() if row.done_cb.isChecked()}
+        return set(self.model.checked_ids())
 
     def _load_data(self):
-        lists = db.get_lists(include_archived=True, include_deleted=False)
-        current = next((l for l in lists if l["id"] == self.list_id), None)
+        data_service().read(load_list_payload, self.list_id, callback=self._apply_data)
+
+    def _apply_data(self, payload):
+        current, content, note_text = payload
         kind = (current or {}).get("kind", "checklist")
         self.title_lbl.setText(current["title"] if current else "Список")
 
-        # очистка виджетов
-        while self.items_layout.count() > 1:
-            it = self.items_layout.takeAt(0); w = it.widget()
-            if w: w.deleteLater()
-        self.rows.clear(); self.selected_items.clear()
-
         # Режим «текст»
         if kind == "text":
             self.delete_action.setVisible(False)
             self.clear_checks_action.setVisible(False)
+            self.repeat_widget.setVisible(False)
+            self.stats_action.setVisible(False)
             self.add_btn.setVisible(False)
-
-            self.text_view = QTextEdit()
-            self.text_view.setObjectName("noteViewer")
-            self.text_view.setReadOnly(True)
-            self.text_view.setPlainText(current.get("note_text") or "")
-            self.items_layout.insertWidget(self.items_layout.count() - 1, self.text_view)
+            self.list_view.setVisible(False); self.empty_hint.setVisible(False)
+
+            if self.text_view is not None:
+                if isinstance(self.text_view, LargeNoteView):
+                    self.text_view.stop()
+                self._root.removeWidget(self.text_view); self.text_view.deleteLater()
+            if note_text is None:
+                self.text_view = LargeNoteView(self.list_id, content)
+            else:
+                self.text_view = QTextEdit()
+                self.text_view.setObjectName("noteViewer")
+                self.text_view.setReadOnly(True)
+                self.text_view.setPlainText(note_text)
+            self._root.insertWidget(self._root.indexOf(self.list_view), self.text_view, 1)
             return
 
         # Режим «чеклист»
         self.delete_action.setVisible(True)
         self.clear_checks_action.setVisible(True)
+        self.repeat_widget.setVisible(True)
+        self.stats_action.setVisible(True)
+        self._show_recurrence(current["recurrence"] if current else None)
         self.add_btn.setVisible(True)
-        self.text_view = None
+        self.list_view.setVisible(True)
+
+        self.model.set_items(toggle_buffer().overlay(content))
+        self.empty_hint.setVisible(self.model.rowCount() == 0)
 
-        items = db.get_items(self.list_id)
-        if not items:
-            hint = QLabel("Пока нет пунктов. Нажмите «Добавить пункт»."); hint.setStyleSheet("color:#6b7280;")
-            self.items_layout.insertWidget(0, hint); return
+    def _show_recurrence(self, rule: str | None):
+        for r, act in self.repeat_actions.items(): act.setChecked(r == rule)
+        self.repeat_btn.setText("🔁" if rule is None else f"🔁 {RECURRENCE_LABELS[rule]}")
 
-        def on_done_toggle(item_id: int, done: bool):
-            db.set_item_checked(item_id, done)
+    def _set_recurrence(self, rule: str | None):
+        self._show_recurrence(rule)
+        data_service().write(db.set_recurrence, self.list_id, rule, callback=lambda _: recurrence_scheduler().reschedule())
 
-        for it in items:
-            row = ItemRow(it, on_done_toggle)
-            row.toggled_for_action.connect(self._on_row_toggle)
-            self.items_layout.insertWidget(self.items_layout.count() - 1, row)
-            self.rows[it["id"]] = row
-            if row.is_selected(): self.selected_items.add(it["id"])
+    def _show_stats(self):
+        # читаем на писателе, в очереди после только что отправленных щелчков, — они уже в истории
+        toggle_buffer().flush()
+        data_service().write(db.completion_stats, self.list_id,
+                            callback=lambda st: CompletionStatsDialog(self.title_lbl.text(), st, self).exec())
 
-    def _on_row_toggle(self, item_id: int, selected: bool):
-        if selected: self.selected_items.add(item_id)
-        else: self.selected_items.discard(item_id)
+    def _on_lists_reset(self, list_ids):
+        # наступили новые сутки — галочки сняты в базе, перечитываем
+        if self.list_id in list_ids and self.text_view is None:
+            self._load_data()
 
     def _uncheck_done(self):
-        changed = False
-        for item_id, row in self.rows.items():
-            if row.done_cb.isChecked():
-                db.set_item_checked(item_id, False)
-                row.set_done(False)
-                changed = True
-            if row.is_selected():
-                row.set_selected(False)
-        self.selected_items.clear()
-        if changed: self._load_data()
+        buffer = toggle_buffer()
+        for iid in self.model.checked_ids(): buffer.set_checked(iid, False)
+        buffer.flush()
+        self.model.uncheck_all()
 
     def _delete_selected(self):
         ids = self._selected_ids()
@@ -329,25 +635,441 @@ class ListWindow(QWidget):
             return
         if not confirm_delete(self, "Удалить", f"Удалить выбранные ({len(ids)}) пункты?"):
             return
-        conn = db.get_conn()
-        qmarks = ",".join(["?"] * len(ids))
-        conn.execute(f"DELETE FROM items WHERE id IN ({qmarks})", list(ids))
-        conn.commit()
-        self._load_data()
+        toggle_buffer().flush()  # писатель один, так что галочки лягут до удаления
+        data_service().write(db.delete_items, ids)
+        self.model.remove_ids(ids)
+        self.empty_hint.setVisible(self.model.rowCount() == 0)
 
     def _add_item(self):
         text, ok = QInputDialog.getText(self, "Новый пункт", "Текст пункта:")
         if not ok or not text.strip(): return
-        db.add_item(self.list_id, text.strip())
-        self._load_data()
+        data_service().write(db.add_item, self.list_id, text.strip(), callback=lambda item_id: self._on_item_added(item_id, text.strip()))
+
+    def _on_item_added(self, item_id: int, text: str):
+        self.model.append_item(item_id, text)
+        self.empty_hint.setVisible(False)
+        self.list_view.scrollToBottom()
 
     def _go_back(self):
         self._exit_on_close = False
         self.home.show()
         self.close()
+        data_service().write(db.checkpoint)
+
+
+class CompletionStatsDialog(QDialog):
+    """Серии и отметки по дням из db.completion_stats (сводка daily_stats, не сырые события)."""
+    RECENT_DAYS = 14
+
+    def __init__(self, title: str, st: dict, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"История: {title}")
+        self.resize(420, 420)
+        view = QPlainTextEdit(); view.setReadOnly(True); view.setFont(QFont("monospace", 10))
+        lines = [f"Серия: {st['current_streak']} дн. подряд (лучшая — {st['best_streak']})",
+                 f"Дней с отметками: {st['active_days']} из {st['days']}",
+                 f"Отмечено пунктов за период: {st['checks']}", ""]
+        by_day = {day: checks for day, checks, _ in st["history"]}
+        top = max(by_day.values(), default=0) or 1
+        today = QDate.currentDate()
+        for i in range(self.RECENT_DAYS):
+            day = today.addDays(-i).toString("yyyy-MM-dd")
+            n = by_day.get(day, 0)
+            lines.append(f"{day}  {'█' * round(20 * n / top):20} {n}")
+        view.setPlainText("\n".join(lines))
+        lay = QVBoxLayout(self); lay.addWidget(view)
+
+
+# ---------- Модель списков главного окна ----------
+HOME_PAGE_SIZE = 200  # строк за одну подгрузку (fetchMore)
+
+_brush_cache: Dict[str, tuple] = {}
+
+
+def color_brushes(hexc: str) -> tuple:
+    """(фон, текст) для цвета карточки; текст тёмный или белый по яркости фона. Кэшируется."""
+    brushes = _brush_cache.get(hexc)
+    if brushes is None:
+        col = QColor(hexc)
+        luma = 0.2126*col.red() + 0.7152*col.green() + 0.0722*col.blue()
+        text_col = QColor("#111827") if luma > 160 else QColor("#ffffff")
+        brushes = _brush_cache[hexc] = (QBrush(col), QBrush(text_col))
+    return brushes
+
+
+class ListsModel(QAbstractTableModel):
+    """
+    Списки для главного окна: колонка 0 — чекбокс групповых действий,
+    колонка 1 — название на цветном фоне. Строки подгружаются страницами
+    по мере прокрутки (canFetchMore/fetchMore), отметки хранятся в модели.
+    """
+    HEADERS = ["", "Список"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: list = []
+        self._query: str | None = None
+        self._cursor: str | None = None  # курсор db.get_lists_page для следующей страницы
+        self._generation = 0            # растёт при set_rows; ответы для старых строк отбрасываются
+        self._fetching = False
+        self.checked: Set[int] = set()
+
+    def set_rows(self, rows: list, query: str | None = None, cursor: str | None = None):
+        """Первая страница результатов (из синхронной загрузки или фонового поиска) и курсор следующей."""
+        self.beginResetModel()
+        self._rows = list(rows); self._query = query; self._cursor = cursor
+        self._generation += 1; self._fetching = False
+        self.checked.clear()
+        self.endResetModel()
+
+    def list_id(self, row: int) -> int:
+        return self._rows[row]["id"]
+
+    def remove_ids(self, ids):
+        ids = set(ids)
+        for i in reversed(range(len(self._rows))):
+            if self._rows[i]["id"] in ids:
+                self.beginRemoveRows(QModelIndex(), i, i); del self._rows[i]; self.endRemoveRows()
+        self.checked.difference_update(ids)
+
+    def refresh_rows(self, ids, on_reorder):
+        """
+        Перечитывает затронутые строки в фоне и обновляет их на месте (архивные/удалённые убирает).
+        Если поменялось закрепление, вызывает on_reorder() — нужен полный порядок заново.
+        """
+        ids = set(ids)
+        ids = [r["id"] for r in self._rows if r["id"] in ids]
+        if not ids:
+            return
+        gen = self._generation
+        data_service().read(lambda: {i: db.get_list(i) for i in ids},
+                            callback=lambda fresh: self._apply_refresh(gen, fresh, on_reorder))
+
+    def _apply_refresh(self, gen: int, fresh_rows: dict, on_reorder):
+        if gen != self._generation:
+            return
+        gone, reorder = set(), False
+        for i, row in enumerate(self._rows):
+            if row["id"] not in fresh_rows:
+                continue
+            fresh = fresh_rows[row["id"]]
+            if fresh is None or fresh["archived"] or fresh["deleted_at"]:
+                gone.add(row["id"]); continue
+            reorder = reorder or fresh["pinned"] != row["pinned"]
+            self._rows[i] = fresh
+            self.dataChanged.emit(self.index(i, 0), self.index(i, 1))
+        self.remove_ids(gone)
+        if reorder: on_reorder()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if index.column() == 0:
+            return Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.UserRole:
+            return row["id"]
+        if index.column() == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if row["id"] in self.checked else Qt.Unchecked
+            return None
+        if role == Qt.DisplayRole:
+            # Показываем тип
+            marker = "📝 " if row.get("kind") == "text" else "🔁 " if row.get("recurrence") else ""
+            return f"{marker}{row['title']}"
+        if role == Qt.BackgroundRole:
+            return color_brushes(row.get("color") or "#ffffff")[0]
+        if role == Qt.ForegroundRole:
+            return color_brushes(row.get("color") or "#ffffff")[1]
+        if role == Qt.ToolTipRole and row.get("kind") != "text":
+            return f"Выполнено {row['done_count']} из {row['item_count']}"
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+        list_id = self._rows[index.row()]["id"]
+        if Qt.CheckState(value) == Qt.Checked: self.checked.add(list_id)
+        else: self.checked.discard(list_id)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._cursor is not None and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._cursor is None or self._fetching:
+            return
+        self._fetching = True
+        gen = self._generation
+        data_service().read(db.get_lists_page, self._cursor, HOME_PAGE_SIZE, {"query": self._query},
+                            callback=lambda result: self._append_page(gen, *result))
+
+    def _append_page(self, gen: int, page: list, cursor: str | None):
+        if gen != self._generation:
+            return  # строки уже заменены новой выборкой
+        self._fetching = False
+        self._cursor = cursor
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+
+
+# ---------- События базы для окон ----------
+class DbEvents(QObject):
+    """
+    Переправляет уведомления db (приходят в потоке, сделавшем коммит)
+    в GUI-поток сигналом changed(list[db.ChangeEvent]).
+    """
+    changed = Signal(object)
+
+
+_db_events: DbEvents | None = None
+
+
+def db_events() -> DbEvents:
+    global _db_events
+    if _db_events is None:
+        _db_events = DbEvents()
+        db.subscribe(_db_events.changed.emit)
+    return _db_events
+
+
+# ---------- Фоновый поиск ----------
+SEARCH_DEBOUNCE_MS = 250  # пауза после последнего нажатия перед запросом
+
+
+class SearchWorker(QObject):
+    """
+    Выполняет поисковые запросы в своём потоке на собственном соединении.
+    Запрос, ставший неактуальным (пришёл новый seq), прерывается через
+    Connection.interrupt(); результаты отдаются сигналом с номером запроса.
+    Повторные и уточняющие запросы («мол» → «моло») отвечает db.SearchCache этого потока.
+    """
+    results_ready = Signal(int, str, object)  # (seq, query, (первая страница, курсор))
+
+    def __init__(self):
+        super().__init__()
+        self._latest = 0
+        self._conn: sqlite3.Connection | None = None
+        self.cache: db.SearchCache | None = None  # создаётся в потоке поиска
+
+    def supersede(self, seq: int):
+        # вызывается из GUI-потока: всё, что меньше seq, больше не нужно
+        self._latest = seq
+        if self._conn is not None:
+            self._conn.interrupt()
+
+    @Slot(int, str)
+    def run_query(self, seq: int, query: str):
+        if seq != self._latest:
+            return  # устарел, пока ждал в очереди
+        self._conn = db.get_conn()
+        if self.cache is None:
+            self.cache = db.SearchCache()
+        try:
+            rows, cursor = self.cache.search(query, HOME_PAGE_SIZE)
+        except sqlite3.OperationalError:
+            return  # прерван более новым запросом
+        if seq == self._latest:
+            self.results_ready.emit(seq, query, (rows, cursor))
+
+    @Slot()
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+        self._conn = None
+        db.close_conn()
+
+
+class SearchController(QObject):
+    """Debounce ввода + фоновый SearchWorker; применяются только результаты последнего запроса."""
+    query_requested = Signal(int, str)
+    results_ready = Signal(object, object, object)  # (первая страница, query или None, курсор)
+
+    def __init__(self, parent=None, debounce_ms: int = SEARCH_DEBOUNCE_MS):
+        super().__init__(parent)
+        self._seq = 0
+        self._query = ""
+        self._timer = QTimer(self); self._timer.setSingleShot(True); self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._dispatch)
+
+        self._thread = QThread(self)
+        self._worker = SearchWorker(); self._worker.moveToThread(self._thread)
+        self.query_requested.connect(self._worker.run_query)
+        self._worker.results_ready.connect(self._on_results)
+        self._thread.start()
+
+    def set_query(self, text: str):
+        self._query = text.strip()
+        self._timer.start()
+
+    def invalidate(self):
+        """Отменить ожидающий/выполняющийся запрос."""
+        self._timer.stop()
+        self._seq += 1
+        self._worker.supersede(self._seq)
+
+    def refresh(self):
+        """Перечитать первую страницу для текущего запроса сразу, без паузы debounce."""
+        self._timer.stop()
+        self._dispatch()
+
+    def _dispatch(self):
+        self._seq += 1
+        self._worker.supersede(self._seq)
+        self.query_requested.emit(self._seq, self._query)
+
+    def _on_results(self, seq: int, query: str, page):
+        if seq == self._seq:
+            rows, cursor = page
+            self.results_ready.emit(rows, query or None, cursor)
+
+    def cache_stats(self) -> dict:
+        """Счётчики кэша поиска (читаются из GUI-потока; это просто числа)."""
+        cache = self._worker.cache
+        return cache.stats() if cache is not None else {}
+
+    def stop(self):
+        self.invalidate()
+        if self._thread.isRunning():
+            QMetaObject.invokeMethod(self._worker, "close", Qt.BlockingQueuedConnection)
+            self._thread.quit(); self._thread.wait()
+
+
+# ---------- Отладочная панель (Ctrl+Shift+D на главном окне) ----------
+class DbStatsDialog(QDialog):
+    """Живые цифры db.stats(): вызовы, перцентили, коммиты, медленные запросы, отложенные галочки."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("База данных: статистика")
+        self.resize(760, 520)
+        self.view = QPlainTextEdit(); self.view.setReadOnly(True)
+        self.view.setFont(QFont("monospace", 9)); self.view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.toggle_btn = QPushButton(); self.toggle_btn.clicked.connect(self._toggle_tracing)
+        reset_btn = QPushButton("Сбросить"); reset_btn.clicked.connect(lambda: (db.reset_stats(), self.refresh()))
+        lay = QVBoxLayout(self)
+        lay.addWidget(self.view, 1); lay.addWidget(self.toggle_btn); lay.addWidget(reset_btn)
+        self._timer = QTimer(self); self._timer.setInterval(1000); self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+        self.refresh()
+
+    def _toggle_tracing(self):
+        if db.tracing_enabled(): db.disable_tracing()
+        else: db.enable_tracing()
+        self.refresh()
+
+    def refresh(self):
+        st = db.stats()
+        self.toggle_btn.setText("Выключить трассировку" if st["enabled"] else "Включить трассировку")
+        lines = [f"трассировка: {'вкл' if st['enabled'] else 'выкл'}   инструкций: {st['statements']}   "
+                 f"коммитов: {st['commits']}   медленных (≥{st.get('slow_ms', 0):g} мс): {st['slow']}", ""]
+        lines.append(f"{'функция':28}{'вызовов':>9}{'всего мс':>11}{'p50':>9}{'p95':>9}{'p99':>9}{'строк':>9}")
+        for name, c in sorted(st["calls"].items(), key=lambda kv: -kv[1]["total_ms"]):
+            lines.append(f"{name:28}{c['count']:>9}{c['total_ms']:>11.1f}{c['p50_ms']:>9.2f}"
+                         f"{c['p95_ms']:>9.2f}{c['p99_ms']:>9.2f}{c['rows']:>9}")
+        tb = toggle_buffer().stats()
+        lines += ["", f"галочки: переключений {tb['toggles']}, схлопнуто {tb['coalesced']}, пачек {tb['flushes']}, "
+                      f"пунктов {tb['items']}, ждут {tb['pending']}, неудачных {tb['failed']}, запись avg {tb['avg_ms']:.1f} / max {tb['max_ms']:.1f} мс"]
+        sc = self.parent().search.cache_stats() if isinstance(self.parent(), HomeWindow) else {}
+        if sc:
+            lines.append(f"кэш поиска: совпадений {sc['hits']}, уточнений в памяти {sc['refined']}, "
+                         f"запросов к базе {sc['misses']}, сбросов {sc['invalidations']}, записей {sc['entries']}")
+        mr = maintenance_scheduler().last_report
+        if mr:
+            lines.append(f"обслуживание: удалено списков {mr['purged']}, освобождено {mr['reclaimed_bytes'] / 1024:.0f} КиБ, "
+                         f"размер базы {mr['bytes'] / 1024:.0f} КиБ (свободно {mr['free_bytes'] / 1024:.0f} КиБ), копия {mr.get('backup', '—')}")
+        slow = db.slow_queries()[-5:]
+        if slow:
+            lines += ["", "последние медленные:"]
+            for q in reversed(slow):
+                lines.append(f"  {q['at']}  {q['function']}({q['args']})  {q['ms']:.1f} мс")
+                for stmt in q["statements"]:
+                    lines.append("    " + " ".join(stmt["sql"].split())[:140])
+                    lines += [f"      └ {p}" for p in stmt["plan"]]
+        bar = self.view.verticalScrollBar(); pos = bar.value()
+        self.view.setPlainText("\n".join(lines))
+        bar.setValue(pos)
+
+
+# ---------- Импорт / экспорт ----------
+class ImportController(QObject):
+    """
+    Импорт файла по пачкам: каждая пачка (ImportJob.step) — отдельная задача
+    писателя, поэтому интерфейс не ждёт, а галочки записываются между пачками.
+    Отмена оставляет контрольную точку: повторный импорт того же файла продолжит с неё.
+    """
+    progress = Signal(int, int, object)  # (байт прочитано, всего байт, счётчики) — из потока писателя
+    finished = Signal(object)            # отчёт ImportJob.report() или None, если импорт прерван
+
+    def __init__(self, path: str, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.job: exchange.ImportJob | None = None
+        self.cancelled = False
+        self._task = None  # Future текущего шага
+        data_service().failed.connect(self._on_failed)
+
+    def start(self):
+        self._task = data_service().write(exchange.ImportJob, self.path, progress=self.progress.emit,
+                                          callback=self._on_created)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _on_created(self, job: exchange.ImportJob):
+        self.job = job
+        self._next()
+
+    def _next(self):
+        if self.cancelled:
+            self._task = data_service().write(self.job.close, callback=lambda _: self._stop())
+            return
+        self._task = data_service().write(self.job.step, callback=self._on_step)
+
+    def _on_step(self, more: bool):
+        if more: self._next()
+        else: self._stop(self.job.report())
+
+    def _on_failed(self, exc):
+        # сама ошибка показывается HomeWindow; здесь только останавливаемся, если упал наш шаг
+        if self._task is not None and self._task.done() and self._task.exception() is exc:
+            if self.job is not None: data_service().write(self.job.close)
+            self._stop()
+
+    def _stop(self, report=None):
+        data_service().failed.disconnect(self._on_failed)
+        self._task = None
+        self.finished.emit(report)
 
 
 # ---------- Стартовое окно ----------
+def pin_lists(ids):
+    with db.transaction():
+        for lid in ids: db.set_pinned(lid, True)
+
+
+def delete_lists(ids):
+    with db.transaction():
+        for lid in ids: db.soft_delete(lid)
+
+
 class HomeWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -355,7 +1077,8 @@ class HomeWindow(QWidget):
         self.setWindowIcon(make_app_icon())
         self.resize(450, 640)
 
-        self.selected_lists: Set[int] = set()
+        self.model = ListsModel(self)
+        self.selected_lists: Set[int] = self.model.checked
 
         root = QVBoxLayout(self); root.setContentsMargins(14, 14, 14, 14); root.setSpacing(10)
 
@@ -366,18 +1089,36 @@ class HomeWindow(QWidget):
         self.new_action = QAction("＋", self); self.new_action.triggered.connect(self._new_list)
         toolbar.addAction(self.search_action); toolbar.addAction(self.pin_action); toolbar.addAction(self.delete_action); toolbar.addSeparator(); toolbar.addAction(self.new_action)
 
-        self.search_edit = QLineEdit(); self.search_edit.setPlaceholderText("Поиск по названию, пунктам и тексту...")
-        self.search_edit.textChanged.connect(self._reload_table); self.search_edit.setVisible(False)
+        self.import_action = QAction("Импорт из JSONL/CSV…", self); self.import_action.triggered.connect(self._import)
+        self.export_action = QAction("Экспорт в JSONL/CSV…", self); self.export_action.triggered.connect(self._export)
+        self.backup_action = QAction("Резервная копия сейчас", self); self.backup_action.triggered.connect(self._backup_now)
+        self.restore_action = QAction("Восстановить из копии…", self); self.restore_action.triggered.connect(self._restore)
+        menu = QMenu(self); menu.addAction(self.import_action); menu.addAction(self.export_action)
+        menu.addSeparator(); menu.addAction(self.backup_action); menu.addAction(self.restore_action)
+        more_btn = QToolButton(); more_btn.setText("⋯"); more_btn.setMenu(menu); more_btn.setPopupMode(QToolButton.InstantPopup)
+        toolbar.addWidget(more_btn)
+        self.importer: ImportController | None = None
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["", "Список"])
+        self.search_edit = QLineEdit(); self.search_edit.setPlaceholderText("Поиск по названию, пунктам и тексту...")
+        self.search_edit.setVisible(False)
+        self.search = SearchController(self)
+        self.search_edit.textChanged.connect(self.search.set_query)
+        self.search.results_ready.connect(self.model.set_rows)
+        db_events().changed.connect(self._on_db_changed)
+        data_service().failed.connect(self._on_db_error)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
         self.tree.setColumnWidth(0, 36)
         self.tree.setRootIsDecorated(False)
-        self.tree.itemChanged.connect(self._on_item_changed)
-        self.tree.itemClicked.connect(self._on_item_clicked)
+        self.tree.setUniformRowHeights(True)
+        self.tree.clicked.connect(self._on_item_clicked)
 
         root.addWidget(toolbar); root.addWidget(self.search_edit); root.addWidget(self.tree, 1)
 
+        self.stats_dialog: DbStatsDialog | None = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self._show_db_stats)
+
         self._apply_styles()
         self._reload_table()
 
@@ -387,7 +1128,7 @@ class HomeWindow(QWidget):
                       font-family: 'Segoe UI','Roboto',sans-serif; font-size:12.5pt; color:#1f2937; }
             QToolBar { background:#f8fafc; border:1px solid #e5e7eb; border-radius:12px; padding:6px; }
             QToolBar QToolButton { padding:8px 12px; border-radius:10px; background:#ffffff; border:1px solid #e5e7eb; margin-right:8px; }
-            QTreeWidget { background:#ffffff; border:1px solid #e5e7eb; border-radius:12px; }
+            QTreeView { background:#ffffff; border:1px solid #e5e7eb; border-radius:12px; }
             QLineEdit { border: 1px solid #e5e7eb; border-radius: 12px; padding: 8px 10px; background:#f9fafb; }
             QTreeView::indicator { width: 18px; height: 18px; border-radius: 4px; border: 1px solid #94a3b8; background: #ffffff; }
             QTreeView::indicator:checked { background: #4f46e5; border: 1px solid #4338ca; }
@@ -401,45 +1142,100 @@ class HomeWindow(QWidget):
     def _new_list(self):
         dlg = NewListDialog(self)
         if dlg.exec():
-            title, items, color, is_checklist, raw_text = dlg.get_data()
+            title, items, color, is_checklist, raw_text, recurrence = dlg.get_data()
             kind = "checklist" if is_checklist else "text"
-            list_id = db.create_list(title, items, color=color, pinned=False, kind=kind, note_text=(None if is_checklist else raw_text))
-            self._reload_table()
-            # сразу открыть только что созданную заметку
-            self._open_list(list_id)
+            # после записи сразу открыть только что созданную заметку
+            data_service().write(db.create_list, title, items, color=color, pinned=False, kind=kind,
+                                 note_text=(None if is_checklist else raw_text), recurrence=recurrence,
+                                 callback=self._on_list_created)
 
-    def _reload_table(self):
-        self.tree.blockSignals(True); self.tree.clear()
-        q = self.search_edit.text().strip() or None
-        lists = db.get_lists(include_archived=False, include_deleted=False, query=q)
-        for row in lists:
-            item = QTreeWidgetItem()
-            item.setData(0, Qt.UserRole, row["id"])
-            item.setCheckState(0, Qt.Unchecked)
-            # Показываем тип
-            marker = "📝 " if row.get("kind") == "text" else ""
-            item.setText(1, f"{marker}{row['title']}")
-            self._apply_item_color(item, row.get("color") or "#ffffff")
-            self.tree.addTopLevelItem(item)
-        self.tree.blockSignals(False); self.selected_lists.clear()
-
-    def _apply_item_color(self, item: QTreeWidgetItem, hexc: str):
-        col = QColor(hexc); item.setBackground(1, QBrush(col))
-        r, g, b = col.red(), col.green(), col.blue()
-        luma = 0.2126*r + 0.7152*g + 0.0722*b
-        text_col = QColor("#111827") if luma > 160 else QColor("#ffffff")
-        item.setForeground(1, QBrush(text_col))
+    def _on_list_created(self, list_id: int):
+        recurrence_scheduler().reschedule()
+        self._open_list(list_id)
+
+    def _import(self):
+        if self.importer is not None:
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт", "", "Данные (*.jsonl *.csv)")
+        if not path: return
+        dlg = QProgressDialog("Импорт…", "Остановить", 0, 1000, self)
+        dlg.setWindowTitle("Импорт"); dlg.setMinimumDuration(300)
+        self.importer = imp = ImportController(path, self)
+        imp.progress.connect(lambda done, total, counts: (
+            dlg.setValue(int(done * 1000 / max(total, 1))),
+            dlg.setLabelText(f"Списков: {counts['lists']}, пунктов: {counts['items']}")))
+        dlg.canceled.connect(imp.cancel)
+        imp.finished.connect(lambda report: self._on_import_finished(dlg, report))
+        imp.start()
+
+    def _on_import_finished(self, dlg: QProgressDialog, report: dict | None):
+        dlg.close(); self.importer.deleteLater(); self.importer = None
+        if report is None:
+            QMessageBox.information(self, "Импорт", "Импорт остановлен. Повторный импорт этого же файла продолжит с места остановки.")
+            return
+        note = " (продолжение прерванного импорта)" if report["resumed"] else ""
+        QMessageBox.information(self, "Импорт", f"Импортировано{note}: списков {report['lists']}, заметок {report['notes']}, "
+                                f"пунктов {report['items']} за {report['seconds']} с. Пропущено записей: {report['skipped']}.")
+
+    def _export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт", "checklists.jsonl", "JSON Lines (*.jsonl);;CSV (*.csv)")
+        if not path: return
+        data_service().read(exchange.export_file, path, callback=lambda counts: QMessageBox.information(
+            self, "Экспорт", f"Сохранено: списков {counts['list']}, заметок {counts['note']}, пунктов {counts['item']}."))
+
+    def _backup_now(self):
+        # копия снимается в фоновом потоке сервиса на своём соединении — галочки и записи не ждут
+        self.backup_action.setEnabled(False)
+        data_service().background(backup.create_backup, cancelled=data_service().closing.is_set,
+                                  callback=self._on_backup_done)
+
+    def _on_backup_done(self, info: dict):
+        self.backup_action.setEnabled(True)
+        QMessageBox.information(self, "Резервная копия", f"Сохранено и проверено: {info['path']}\n"
+                                f"{info['bytes'] / 1024:.0f} КиБ за {info['seconds']} с.")
+
+    def _restore(self):
+        if self.importer is not None:
+            QMessageBox.information(self, "Восстановление", "Дождитесь окончания импорта."); return
+        path, _ = QFileDialog.getOpenFileName(self, "Восстановить из копии", backup.backup_dir(), "База SQLite (*.db)")
+        if not path: return
+        if not confirm_delete(self, "Восстановить", "Заменить все заметки содержимым копии?\n"
+                              "Текущая база будет сохранена копией с пометкой pre-restore."): return
+        toggle_buffer().flush()  # несохранённые галочки попадут в страховочную копию
+        data_service().write(backup.restore_backup, path, callback=lambda info: QMessageBox.information(
+            self, "Восстановление", f"Восстановлено из {info['restored']}.\nПрежняя база: {info['previous']}"))
 
-    def _on_item_changed(self, item: QTreeWidgetItem, col: int):
-        if col != 0: return
-        list_id = item.data(0, Qt.UserRole)
-        if item.checkState(0) == Qt.Checked: self.selected_lists.add(list_id)
-        else: self.selected_lists.discard(list_id)
+    def closeEvent(self, event):
+        self.search.stop()
+        super().closeEvent(event)
 
-    def _on_item_clicked(self, item: QTreeWidgetItem, col: int):
-        if col == 1:
-            list_id = item.data(0, Qt.UserRole)
-            self._open_list(list_id)
+    def _reload_table(self):
+        # первая страница читается в потоке поиска; результат придёт в model.set_rows
+        self.search.refresh()
+
+    def _show_db_stats(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = DbStatsDialog(self)
+        self.stats_dialog.show(); self.stats_dialog.raise_()
+
+    def _on_db_error(self, exc: Exception):
+        self.backup_action.setEnabled(True)  # если упала резервная копия
+        if isinstance(exc, backup.BackupCancelled): return  # выход из приложения во время копии
+        QMessageBox.warning(self, "Ошибка базы данных", str(exc))
+
+    def _on_db_changed(self, events):
+        # новые списки встают в середину порядка — проще перечитать первую страницу
+        if any(ev.kind in (db.LIST_CREATED, db.DATABASE_REPLACED) for ev in events):
+            self._reload_table(); return
+        deleted = {ev.list_id for ev in events if ev.kind == db.LIST_DELETED}
+        self.model.remove_ids(deleted)
+        touched = {ev.list_id for ev in events} - deleted
+        if touched:
+            self.model.refresh_rows(touched, self._reload_table)
+
+    def _on_item_clicked(self, index: QModelIndex):
+        if index.column() == 1:
+            self._open_list(self.model.list_id(index.row()))
 
     def _open_list(self, list_id: int):
         self.list_win = ListWindow(list_id, home=self)
@@ -450,23 +1246,31 @@ class HomeWindow(QWidget):
     def _pin_selected(self):
         if not self.selected_lists:
             QMessageBox.information(self, "Нет выбора", "Отметьте списки чекбоксами слева."); return
-        for lid in list(self.selected_lists): db.set_pinned(lid, True)
-        self._reload_table()
+        data_service().write(pin_lists, list(self.selected_lists))
 
     def _delete_selected(self):
         if not self.selected_lists:
             QMessageBox.information(self, "Нет выбора", "Отметьте списки чекбоксами слева."); return
         if not confirm_delete(self, "Удалить", f"Удалить выбранные ({len(self.selected_lists)}) списки?"): return
-        for lid in list(self.selected_lists): db.soft_delete(lid)
-        self._reload_table()
+        data_service().write(delete_lists, list(self.selected_lists))
 
 
 def main():
     app = QApplication(sys.argv)
     app.setStyle(QStyleFactory.create("Fusion"))
     app.setWindowIcon(make_app_icon())
-    db.get_conn()
+    service = data_service()
+    service.write(db.get_conn).result()  # миграции — до первого чтения
     w = HomeWindow()
+    maintenance_scheduler().start()
+    recurrence_scheduler().start()  # списки, чьи сутки закончились, пока приложение было закрыто
+    app.aboutToQuit.connect(w.search.stop)
+    app.aboutToQuit.connect(maintenance_scheduler().stop)
+    app.aboutToQuit.connect(recurrence_scheduler().stop)
+    app.aboutToQuit.connect(toggle_buffer().flush)
+    app.aboutToQuit.connect(service.closing.set)  # идущая резервная копия остановится и отпустит снимок WAL
+    app.aboutToQuit.connect(lambda: service.write(db.checkpoint, truncate=True).result())
+    app.aboutToQuit.connect(service.shutdown)
     w.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,17 @@
+"""Общие фикстуры: каждый тест работает со своим файлом базы во временной папке."""
+import pytest
+
+import db
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """
+    Путь к временной базе. Прежний db._DB_PATH возвращается после теста,
+    соединение потока закрывается до и после, так что тесты не наследуют чужую базу.
+    """
+    db.close_conn()
+    path = tmp_path / "app.db"
+    monkeypatch.setattr(db, "_DB_PATH", str(path))
+    yield path
+    db.close_conn()
@@ -0,0 +1,43 @@
+"""Резервные копии: снятие на фоновом потоке, проверка и ротация."""
+import sqlite3
+import threading
+
+import backup
+import db
+
+
+def _in_thread(fn):
+    result = {}
+
+    def run():
+        result["value"] = fn()
+        result["has_conn"] = db.has_conn()
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    return result
+
+
+def test_backup_on_worker_thread_leaves_no_connection(db_path, tmp_path):
+    lid = db.create_list("Покупки", ["Молоко", "Хлеб"])
+    result = _in_thread(lambda: backup.create_backup(str(tmp_path / "b"), pause=0))
+    assert result["has_conn"] is False
+    conn = sqlite3.connect(result["value"]["path"])
+    assert conn.execute("SELECT title FROM lists WHERE id = ?", (lid,)).fetchone() == ("Покупки",)
+    conn.close()
+
+
+def test_backup_keeps_caller_connection(db_path, tmp_path):
+    conn = db.get_conn()
+    backup.create_backup(str(tmp_path / "b"), pause=0)
+    assert db.get_conn() is conn
+
+
+def test_rotation_keeps_tagged_copies(db_path, tmp_path):
+    dest = str(tmp_path / "b")
+    db.create_list("Покупки", [])
+    safety = backup.create_backup(dest, tag="pre-restore", keep=0, pause=0)["path"]
+    for _ in range(3):
+        info = backup.create_backup(dest, keep=2, pause=0)
+    paths = backup.list_backups(dest)
+    assert safety in paths and info["path"] in paths and len(paths) == 3
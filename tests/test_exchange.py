@@ -0,0 +1,57 @@
+"""Экспорт и импорт JSONL/CSV."""
+import json
+import os
+
+import pytest
+
+import db
+import exchange
+
+
+def _schema_version():
+    return db.get_conn().execute("PRAGMA schema_version").fetchone()[0]
+
+
+def test_failed_export_leaves_no_part_file(db_path, tmp_path, monkeypatch):
+    db.create_list("Покупки", ["Молоко"])
+    monkeypatch.setattr(exchange, "CHUNK_RECORDS", 1)
+    out = tmp_path / "out.jsonl"
+
+    def progress(_counts):
+        raise RuntimeError("диск заполнен")
+    with pytest.raises(RuntimeError):
+        exchange.export_file(str(out), progress=progress)
+    assert not out.exists() and not (tmp_path / "out.jsonl.part").exists()
+    assert not db.get_conn().in_transaction
+
+
+def test_round_trip_with_empty_title(db_path, tmp_path, monkeypatch):
+    db.create_list("", ["a", "b"])
+    db.create_list("Заметка", [], kind="text", note_text="текст")
+    for ext in ("csv", "jsonl"):
+        exchange.export_file(str(tmp_path / f"out.{ext}"))
+    db.close_conn()
+    monkeypatch.setattr(db, "_DB_PATH", str(tmp_path / "copy.db"))
+    report = exchange.import_file(str(tmp_path / "out.csv"))
+    assert (report["lists"], report["items"], report["skipped"]) == (2, 2, 0)
+    assert sorted(r.title for r in db.get_lists()) == ["", "Заметка"]
+
+
+def test_bulk_import_keeps_schema_and_counters(db_path, tmp_path):
+    n = db.BULK_TRIGGER_THRESHOLD + 10
+    path = tmp_path / "big.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "list", "id": 7, "title": "Большой"}) + "\n")
+        for i in range(n):
+            f.write(json.dumps({"type": "item", "list_id": 7, "text": f"пункт {i}", "checked": i % 2}) + "\n")
+    before = _schema_version()
+    report = exchange.import_file(str(path))
+    assert report["items"] == n
+    assert _schema_version() == before  # триггеры выключаются без DDL
+    assert db.get_meta("bulk_items") is None
+    rec = db.get_lists()[0]
+    assert (rec.item_count, rec.done_count) == (n, n // 2)
+    assert [r.id for r in db.get_lists(query="пункт 1009")] == [rec.id]
+    lid = db.create_list("После импорта", ["хвост"])  # построчные триггеры снова работают
+    assert db.get_list(lid).item_count == 1
+    assert [r.id for r in db.get_lists(query="хвост")] == [lid]
@@ -0,0 +1,170 @@
+"""
+Обновление баз, созданных прежними версиями приложения (до PRAGMA user_version).
+
+Каждая фикстура собирает файл базы той схемы, которую оставляла старая версия,
+затем db.get_conn() доводит её до SCHEMA_VERSION через init_db.
+"""
+import sqlite3
+
+import pytest
+
+import db
+
+# схема исходной версии: тексты заметок в lists.note_text, B-tree индексы по тексту
+BASELINE_SCHEMA = """
+CREATE TABLE lists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    archived INTEGER NOT NULL DEFAULT 0,
+    color TEXT DEFAULT '#ffffff',
+    deleted_at TIMESTAMP,
+    kind TEXT NOT NULL DEFAULT 'checklist',
+    note_text TEXT
+);
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    list_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    checked INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY(list_id) REFERENCES lists(id) ON DELETE CASCADE
+);
+CREATE INDEX idx_lists_title ON lists(title);
+CREATE INDEX idx_lists_note_text ON lists(note_text);
+CREATE INDEX idx_items_list_text ON items(list_id, text);
+"""
+
+# версия с поиском через FTS5: индексы по тексту удалены, триггеры ещё читают note_text
+FTS_SCHEMA = """
+DROP INDEX idx_lists_title;
+DROP INDEX idx_lists_note_text;
+CREATE VIRTUAL TABLE search_fts USING fts5(
+    body, list_id UNINDEXED, tokenize='trigram case_sensitive 0'
+);
+CREATE TRIGGER trg_lists_fts_ins AFTER INSERT ON lists BEGIN
+    INSERT INTO search_fts(rowid, body, list_id)
+    VALUES (-new.id, new.title || char(10) || COALESCE(new.note_text, ''), new.id);
+END;
+CREATE TRIGGER trg_lists_fts_upd AFTER UPDATE OF title, note_text ON lists BEGIN
+    DELETE FROM search_fts WHERE rowid = -old.id;
+    INSERT INTO search_fts(rowid, body, list_id)
+    VALUES (-new.id, new.title || char(10) || COALESCE(new.note_text, ''), new.id);
+END;
+CREATE TRIGGER trg_lists_fts_del AFTER DELETE ON lists BEGIN
+    DELETE FROM search_fts WHERE rowid = -old.id;
+END;
+CREATE TRIGGER trg_items_fts_ins AFTER INSERT ON items BEGIN
+    INSERT INTO search_fts(rowid, body, list_id) VALUES (new.id, new.text, new.list_id);
+END;
+CREATE TRIGGER trg_items_fts_upd AFTER UPDATE OF text, list_id ON items BEGIN
+    DELETE FROM search_fts WHERE rowid = old.id;
+    INSERT INTO search_fts(rowid, body, list_id) VALUES (new.id, new.text, new.list_id);
+END;
+CREATE TRIGGER trg_items_fts_del AFTER DELETE ON items BEGIN
+    DELETE FROM search_fts WHERE rowid = old.id;
+END;
+"""
+
+# версия со счётчиками пунктов, которые ведут триггеры
+COUNTERS_SCHEMA = """
+ALTER TABLE lists ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE lists ADD COLUMN done_count INTEGER NOT NULL DEFAULT 0;
+CREATE TRIGGER trg_items_cnt_ins AFTER INSERT ON items BEGIN
+    UPDATE lists SET item_count = item_count + 1, done_count = done_count + (new.checked != 0)
+    WHERE id = new.list_id;
+END;
+CREATE TRIGGER trg_items_cnt_del AFTER DELETE ON items BEGIN
+    UPDATE lists SET item_count = item_count - 1, done_count = done_count - (old.checked != 0)
+    WHERE id = old.list_id;
+END;
+CREATE TRIGGER trg_items_cnt_upd AFTER UPDATE OF checked, list_id ON items
+WHEN old.list_id != new.list_id OR (old.checked != 0) != (new.checked != 0) BEGIN
+    UPDATE lists SET item_count = item_count - 1, done_count = done_count - (old.checked != 0)
+    WHERE id = old.list_id;
+    UPDATE lists SET item_count = item_count + 1, done_count = done_count + (new.checked != 0)
+    WHERE id = new.list_id;
+END;
+"""
+
+ERAS = {
+    "baseline": [BASELINE_SCHEMA],
+    "fts": [BASELINE_SCHEMA, FTS_SCHEMA],
+    "counters": [BASELINE_SCHEMA, FTS_SCHEMA, COUNTERS_SCHEMA],
+}
+
+
+def _fill(conn: sqlite3.Connection) -> None:
+    """Данные, как их записала бы старая версия: чеклист, заметка и пустой список."""
+    conn.execute("INSERT INTO lists (id, title, kind, updated_at) VALUES (1, 'Покупки', 'checklist', CURRENT_TIMESTAMP)")
+    conn.executemany("INSERT INTO items (list_id, text, checked) VALUES (1, ?, ?)",
+                     [("Молоко", 1), ("Хлеб", 0), ("Сыр", 1)])
+    conn.execute("INSERT INTO lists (id, title, kind, note_text) VALUES (2, 'Дневник', 'text', 'Позвонить бабушке')")
+    conn.execute("INSERT INTO lists (id, title) VALUES (3, 'Пустой')")
+
+
+@pytest.fixture(params=sorted(ERAS))
+def old_db(request, db_path):
+    conn = sqlite3.connect(db_path)
+    for script in ERAS[request.param]:
+        conn.executescript(script)
+    _fill(conn)
+    conn.commit()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    conn.close()
+    return db_path
+
+
+def test_upgrade_reaches_current_version(old_db):
+    conn = db.get_conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert [name for _v, name, _s in db._last_migrations] == [name for name, _step in db.MIGRATIONS]
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert not db._column_exists(conn, "lists", "note_text") or \
+        conn.execute("SELECT COUNT(*) FROM lists WHERE note_text IS NOT NULL").fetchone()[0] == 0
+    assert not db._table_exists(conn, "idx_lists_title")
+    assert not db._table_exists(conn, "idx_lists_note_text")
+
+
+def test_note_text_moved_to_notes(old_db):
+    assert db.get_note_text(2) == "Позвонить бабушке"
+    assert db.get_note_text(1) is None
+    assert db.get_list(2).kind == "text"
+
+
+def test_counters_match_items(old_db):
+    counts = {rec.id: (rec.item_count, rec.done_count) for rec in db.get_lists()}
+    assert counts == {1: (3, 2), 2: (0, 0), 3: (0, 0)}
+    assert db.check_counters() == []
+    db.set_item_checked(db.get_items(1)[1].id, True)
+    assert (db.get_list(1).item_count, db.get_list(1).done_count) == (3, 3)
+
+
+def test_search_after_upgrade(old_db):
+    assert [rec.id for rec in db.get_lists(query="молок")] == [1]
+    assert [rec.id for rec in db.get_lists(query="БАБУШК")] == [2]
+    assert [rec.id for rec in db.get_lists(query="Пусто")] == [3]
+    new_id = db.create_list("Поездка", ["Паспорт"])
+    assert [rec.id for rec in db.get_lists(query="паспорт")] == [new_id]
+
+
+def test_items_keep_order(old_db):
+    assert [item.text for item in db.get_items(1)] == ["Молоко", "Хлеб", "Сыр"]
+
+
+def test_second_init_applies_nothing(old_db):
+    conn = db.get_conn()
+    assert db.init_db(conn) == []
+    db.close_conn()
+    conn = db.get_conn()
+    assert db._last_migrations == []
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+
+
+def test_newer_database_is_refused(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA user_version = {db.SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        db.get_conn()
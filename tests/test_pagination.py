@@ -0,0 +1,77 @@
+"""Keyset-пагинация главного экрана (get_lists_page)."""
+import pytest
+
+import db
+
+
+def _all_pages(limit, filters=None):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = db.get_lists_page(cursor, limit, filters)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def _ids(rows):
+    return [r.id for r in rows]
+
+
+@pytest.fixture
+def lists(db_path):
+    """25 списков с одинаковыми updated_at/created_at, каждый третий закреплён, два архивных."""
+    ids = [db.create_list(f"Список {i}", []) for i in range(25)]
+    conn = db.get_conn()
+    conn.execute("UPDATE lists SET updated_at = '2026-01-01 10:00:00', created_at = '2026-01-01 09:00:00'")
+    conn.executemany("UPDATE lists SET pinned = 1 WHERE id = ?", [(i,) for i in ids[::3]])
+    conn.executemany("UPDATE lists SET archived = 1 WHERE id = ?", [(ids[4],), (ids[5],)])
+    conn.commit()
+    return ids
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 23, 100])
+def test_pages_have_no_duplicates_or_gaps(lists, limit):
+    rows, pages = _all_pages(limit)
+    assert _ids(rows) == _ids(db.get_lists())
+    assert len(set(_ids(rows))) == len(rows) == 23
+    assert pages == max(1, -(-23 // limit))
+
+
+def test_equal_timestamps_ordered_by_id(lists):
+    rows, _ = _all_pages(4)
+    pinned = [r.id for r in rows if r.pinned]
+    assert pinned == sorted(pinned, reverse=True)
+    assert _ids(rows) == pinned + sorted({*lists} - {*pinned} - {lists[4], lists[5]}, reverse=True)
+
+
+def test_pinned_lists_come_first_across_pages(lists):
+    conn = db.get_conn()
+    conn.execute("UPDATE lists SET updated_at = '2026-02-01 10:00:00' WHERE pinned = 0")
+    conn.commit()
+    rows, _ = _all_pages(3)
+    flags = [r.pinned for r in rows]
+    assert flags == sorted(flags, reverse=True)  # свежие незакреплённые не обгоняют закреплённые
+    assert _ids(rows) == _ids(db.get_lists())
+
+
+def test_archived_filter_pages(lists):
+    rows, _ = _all_pages(5, {"include_archived": True})
+    assert sorted(_ids(rows)) == sorted(lists)
+    assert len(set(_ids(rows))) == 25
+
+
+def test_update_between_pages_does_not_repeat_rows(lists):
+    first, cursor = db.get_lists_page(None, 5)
+    db.add_item(first[0].id, "новый пункт")  # поднимает список наверх, он уже показан
+    rest = []
+    while cursor:
+        page, cursor = db.get_lists_page(cursor, 5)
+        rest.extend(page)
+    assert not set(_ids(first)) & set(_ids(rest))
+    assert len(first) + len(rest) == 23
+
+
+def test_bad_cursor_is_rejected(db_path):
+    with pytest.raises(ValueError):
+        db.get_lists_page("не курсор", 10)
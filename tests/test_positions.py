@@ -0,0 +1,77 @@
+"""Порядок пунктов: дробные позиции move_item и перенумерация rebalance_positions."""
+import pytest
+
+import db
+
+
+def _order(list_id):
+    return [item.id for item in db.get_items(list_id)]
+
+
+def _positions(list_id):
+    return [r[0] for r in db.get_conn().execute(
+        "SELECT position FROM items WHERE list_id=? ORDER BY position, id", (list_id,))]
+
+
+def _move(order, item_id, before_id):
+    """Тот же перенос на списке id — ожидаемый порядок."""
+    order = [i for i in order if i != item_id]
+    order.insert(order.index(before_id) if before_id is not None else len(order), item_id)
+    return order
+
+
+@pytest.fixture
+def checklist(db_path):
+    lid = db.create_list("Порядок", [f"пункт {i}" for i in range(6)])
+    return lid, _order(lid)
+
+
+def test_repeated_moves_between_same_neighbours_ask_for_rebalance(checklist):
+    lid, order = checklist
+    moves = 0
+    while True:
+        # последний пункт — всё ближе к первому: зазор между соседями каждый раз делится пополам
+        item_id, before_id = order[-1], order[1]
+        crowded = db.move_item(item_id, before_id)
+        order = _move(order, item_id, before_id)
+        moves += 1
+        assert _order(lid) == order
+        if crowded:
+            break
+        assert moves < 100, "move_item так и не попросил перенумерацию"
+    assert db.rebalance_positions(lid) == len(order)
+    assert _order(lid) == order
+    assert _positions(lid) == [(n + 1) * db.POSITION_STEP for n in range(len(order))]
+    assert db.move_item(order[-1], order[1]) is False  # после перенумерации места снова хватает
+
+
+def test_order_survives_ignored_rebalance(checklist):
+    lid, order = checklist
+    for _ in range(200):  # без rebalance_positions точность кончается, move_item перенумерует сам
+        item_id, before_id = order[-1], order[1]
+        db.move_item(item_id, before_id)
+        order = _move(order, item_id, before_id)
+    assert _order(lid) == order
+    assert len(set(_positions(lid))) == len(order)
+
+
+def test_move_to_start_and_end(checklist):
+    lid, order = checklist
+    db.move_item(order[3], order[0])
+    order = _move(order, order[3], order[0])
+    assert _order(lid) == order
+    db.move_item(order[1], None)
+    order = _move(order, order[1], None)
+    assert _order(lid) == order
+    db.move_item(order[-1], None)  # последний остаётся последним
+    assert _order(lid) == order
+    new_id = db.add_item(lid, "новый")  # новый пункт встаёт после перенесённого в конец
+    assert _order(lid) == order + [new_id]
+
+
+def test_move_before_item_of_other_list_is_refused(checklist):
+    lid, order = checklist
+    other = db.create_list("Другой", ["чужой"])
+    with pytest.raises(ValueError):
+        db.move_item(order[0], _order(other)[0])
+    assert _order(lid) == order
@@ -0,0 +1,109 @@
+"""Повторяющиеся чеклисты: расписание сброса галочек и его отношение к истории."""
+import os
+import time
+
+import pytest
+
+import db
+
+WEDNESDAY = "2026-03-04 00:00:00"  # полночь среды (UTC)
+
+
+@pytest.fixture
+def utc():
+    """Расписание считается в местном времени; в тестах местное время — UTC."""
+    saved = os.environ.get("TZ")
+    os.environ["TZ"] = "UTC"; time.tzset()
+    yield
+    if saved is None:
+        os.environ.pop("TZ")
+    else:
+        os.environ["TZ"] = saved
+    time.tzset()
+
+
+def _next_reset(list_id):
+    return db.get_conn().execute("SELECT next_reset_at FROM lists WHERE id=?", (list_id,)).fetchone()[0]
+
+
+def _due_at(list_id, moment):
+    db.get_conn().execute("UPDATE lists SET next_reset_at=? WHERE id=?", (moment, list_id))
+    db.get_conn().commit()
+
+
+def _checked_list(rule):
+    lid = db.create_list(rule, ["a", "b"], recurrence=rule)
+    for item in db.get_items(lid):
+        db.set_item_checked(item.id, True)
+    return lid
+
+
+def _unchecks(list_id):
+    return db.get_conn().execute("SELECT COALESCE(SUM(unchecks), 0) FROM daily_stats WHERE list_id=?",
+                                 (list_id,)).fetchone()[0]
+
+
+def test_scheduled_reset_is_not_recorded_as_unchecks(db_path):
+    lid = db.create_list("Утро", ["Зарядка", "Завтрак"], recurrence="daily")
+    first, second = [item.id for item in db.get_items(lid)]
+    db.set_item_checked(first, True)
+    db.set_item_checked(second, True)
+    db.set_item_checked(second, False)  # пользователь снял сам — это в истории должно остаться
+    events = db.get_conn().execute("SELECT COUNT(*) FROM check_events").fetchone()[0]
+
+    assert db.reset_due_lists(now=_next_reset(lid)) == [lid]
+    assert [item.checked for item in db.get_items(lid)] == [0, 0]
+    assert _unchecks(lid) == 1
+    assert db.get_conn().execute("SELECT COUNT(*) FROM check_events").fetchone()[0] == events
+    assert db.get_meta("history_paused") is None
+
+    db.set_item_checked(first, True)
+    db.set_item_checked(first, False)
+    assert _unchecks(lid) == 2  # после сброса история снова пишется
+
+
+def test_daily_reset_and_next_moment(db_path, utc):
+    lid = _checked_list("daily")
+    _due_at(lid, WEDNESDAY)
+    assert db.reset_due_lists(now="2026-03-03 23:59:59") == []  # ещё не пора
+    assert db.get_list(lid).done_count == 2
+    assert db.reset_due_lists(now="2026-03-04 00:00:05") == [lid]
+    assert db.get_list(lid).done_count == 0
+    assert _next_reset(lid) == "2026-03-05 00:00:00"
+
+
+def test_no_second_reset_on_the_same_day(db_path, utc):
+    lid = _checked_list("daily")
+    _due_at(lid, WEDNESDAY)
+    assert db.reset_due_lists(now="2026-03-04 07:00:00") == [lid]
+    for item in db.get_items(lid):
+        db.set_item_checked(item.id, True)
+    assert db.reset_due_lists(now="2026-03-04 23:00:00") == []
+    assert db.get_list(lid).done_count == 2
+    assert db.reset_due_lists(now="2026-03-05 00:00:00") == [lid]
+
+
+def test_weekly_and_weekdays_schedule(db_path, utc):
+    weekly, weekdays = _checked_list("weekly"), _checked_list("weekdays")
+    _due_at(weekly, WEDNESDAY)
+    _due_at(weekdays, "2026-03-06 00:00:00")  # пятница
+    assert db.reset_due_lists(now="2026-03-06 00:00:01") == [weekly, weekdays]
+    assert _next_reset(weekly) == "2026-03-09 00:00:00"     # понедельник
+    assert _next_reset(weekdays) == "2026-03-09 00:00:00"   # выходные пропущены
+    assert db.get_next_reset() == "2026-03-09 00:00:00"
+
+
+def test_next_reset_follows_local_midnight(db_path, utc):
+    lid = _checked_list("daily")
+    os.environ["TZ"] = "Europe/Moscow"; time.tzset()  # UTC+3 без перехода на летнее время; вернёт фикстура utc
+    _due_at(lid, WEDNESDAY)
+    assert db.reset_due_lists(now="2026-03-04 00:00:00") == [lid]
+    assert _next_reset(lid) == "2026-03-04 21:00:00"  # полночь 5 марта по Москве
+
+
+def test_rule_removed_stops_resets(db_path):
+    lid = _checked_list("daily")
+    db.set_recurrence(lid, None)
+    assert _next_reset(lid) is None
+    assert db.reset_due_lists(now="2100-01-01 00:00:00") == []
+    assert db.get_list(lid).done_count == 2
@@ -0,0 +1,43 @@
+"""Поиск на главном экране: индекс триграмм и короткие запросы по названиям."""
+import db
+
+
+def _ids(rows):
+    return [r.id for r in rows]
+
+
+def test_trigram_search_finds_items_and_notes(db_path):
+    shop = db.create_list("Покупки", ["Молоко", "Хлеб"])
+    note = db.create_list("Дневник", [], kind="text", note_text="Позвонить бабушке")
+    db.create_list("Работа", ["Отчёт"])
+    assert _ids(db.get_lists(query="МОЛОК")) == [shop]
+    assert _ids(db.get_lists(query="бабушк")) == [note]
+
+
+def test_two_character_title_match(db_path):
+    tv = db.create_list("ТВ", ["Пульт"])
+    db.create_list("Покупки", ["Молоко"])
+    db.create_list("Отпуск", ["Паспорт"])
+    assert _ids(db.get_lists(query="ТВ")) == [tv]
+    assert _ids(db.get_lists(query="тв")) == [tv]
+    rows, cursor = db.get_lists_page(None, 10, {"query": "тВ"})
+    assert _ids(rows) == [tv] and cursor is None
+
+
+def test_short_query_searches_titles_only(db_path):
+    pp = db.create_list("Пп", ["Сыр"])
+    db.create_list("Дом", ["ыр"])  # совпадение только в пункте
+    assert _ids(db.get_lists(query="ыр")) == []
+    assert _ids(db.get_lists(query="п")) == [pp]
+
+
+def test_short_query_pages_without_gaps(db_path):
+    ids = [db.create_list(f"Список {n}", ["x"]) for n in range(7)]
+    db.create_list("Другое", ["x"])
+    seen, cursor = [], None
+    while True:
+        rows, cursor = db.get_lists_page(cursor, 3, {"query": "сп"})
+        seen += _ids(rows)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(ids) and len(seen) == len(set(seen))
@@ -0,0 +1,72 @@
+"""Кэш поиска: уточнение запроса в памяти и сброс при записи."""
+import sqlite3
+
+import pytest
+
+import db
+
+
+def _ids(rows):
+    return [r.id for r in rows]
+
+
+@pytest.fixture
+def cache(db_path):
+    db.create_list("Список покупок", ["Молоко", "Хлеб"])
+    db.create_list("Списание", ["Акт"])
+    db.create_list("Дела", ["Составить список гостей", "Спис — черновик"])
+    db.create_list("Отпуск", ["Паспорт"])
+    cache = db.SearchCache()
+    yield cache
+    cache.close()
+
+
+def test_longer_query_is_refined_in_memory(cache):
+    broad, _ = cache.search("спис")
+    narrow, _ = cache.search("списо")
+    stats = cache.stats()
+    assert (stats["misses"], stats["refined"], stats["hits"]) == (1, 1, 0)
+    assert set(_ids(narrow)) < set(_ids(broad))
+    cache.search("СПИСО")  # регистр не важен: та же запись кэша
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("query", ["списо", "список п", "пис", "черновик"])
+def test_refined_rows_match_fresh_query(cache, query):
+    cache.search(query[:3])
+    refined, _ = cache.search(query)
+    fresh, _ = db.get_lists_page(None, 100, {"query": query})
+    assert _ids(refined) == _ids(fresh)
+
+
+def test_refined_pages_match_fresh_pages(cache):
+    for i in range(7):
+        db.create_list(f"Список {i}", [])
+    cache.search("спис")
+    rows, cursor = cache.search("списо", limit=3)
+    while cursor:
+        page, cursor = cache.search("списо", limit=3, cursor=cursor)
+        rows += page
+    assert _ids(rows) == _ids(db.get_lists(query="списо"))
+    assert len(set(_ids(rows))) == len(rows)
+
+
+def test_insert_invalidates_cache(cache):
+    before, _ = cache.search("спис")
+    lid = db.create_list("Новый", ["список дел"])  # запись этого же соединения — через шину изменений
+    after, _ = cache.search("спис")
+    assert cache.stats()["invalidations"] == 1
+    assert _ids(after) == [lid] + _ids(before)
+    refined, _ = cache.search("список д")
+    assert _ids(refined) == [lid]
+
+
+def test_title_change_from_other_connection_invalidates_cache(cache, db_path):
+    cache.search("паспорт")
+    other = sqlite3.connect(db_path)  # другое соединение видно только по PRAGMA data_version
+    other.execute("UPDATE lists SET title = 'Загранпаспорт' WHERE title = 'Дела'")
+    other.commit()
+    other.close()
+    rows, _ = cache.search("паспорт")
+    assert cache.stats()["invalidations"] == 1
+    assert sorted(r.title for r in rows) == ["Загранпаспорт", "Отпуск"]